@@ -0,0 +1,137 @@
+# benchmarks/game_load.py
+"""
+Load test for the WebSocket game server.
+
+    uvicorn backend.main:app --port 8000
+    python -m backend.benchmarks.game_load --rooms 200 --players 4 --duration 10
+
+Opens --rooms rooms with --players bots each. Every bot answers each new center
+card with the correct claim after --think-ms, so bots in a room race each other
+like real players. Reports messages per second (sent + received) and the claim
+round-trip latency percentiles.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+import websockets
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.claims = 0
+        self.won = 0
+        self.latencies: List[float] = []
+
+
+def _create_room(base_url: str, n: int) -> str:
+    req = urllib.request.Request(f"{base_url}/dobble/games", data=json.dumps({"n": n}).encode(),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req) as resp:
+        return json.load(resp)["id"]
+
+
+async def _bot(ws_url: str, room_id: str, index: int, stats: Stats,
+               deadline: float, think_s: float, seed: int, all_joined: asyncio.Barrier) -> None:
+    async with websockets.connect(f"{ws_url}/dobble/games/{room_id}/ws?name=bot{index}") as ws:
+        me: Optional[str] = None
+        pending: Dict[int, float] = {}  # seq -> send time
+        seq = 0
+        last_center = None
+
+        async def send(message: Dict) -> None:
+            stats.sent += 1
+            await ws.send(json.dumps(message))
+
+        async def reader() -> None:
+            nonlocal me, seq, last_center
+            async for raw in ws:
+                stats.received += 1
+                msg = json.loads(raw)
+                kind = msg["type"]
+                if kind == "joined":
+                    me = msg["player"]
+                elif kind == "claim":
+                    started = pending.pop(msg["seq"], None)
+                    if started is not None:
+                        stats.latencies.append(time.perf_counter() - started)
+                    stats.won += msg["ok"]
+                elif kind == "state" and msg["status"] == "finished" and index == 0 and time.time() < deadline:
+                    await send({"type": "start", "seed": seed})
+                elif kind == "state" and msg["status"] == "playing":
+                    center = msg["center"]
+                    mine = next((p for p in msg["players"] if p["id"] == me), None)
+                    if mine is None or center["card"] == last_center:
+                        continue
+                    last_center = center["card"]
+                    symbol = next(iter(set(mine["symbols"]) & set(center["symbols"])))
+                    if think_s:
+                        await asyncio.sleep(think_s)
+                    seq += 1
+                    pending[seq] = time.perf_counter()
+                    stats.claims += 1
+                    await send({"type": "claim", "symbol": symbol, "seq": seq})
+
+        task = asyncio.create_task(reader())
+        await all_joined.wait()
+        if index == 0:
+            await send({"type": "start", "seed": seed})
+        await asyncio.sleep(max(0.0, deadline - time.time()))
+        task.cancel()
+
+
+async def run(base_url: str, rooms: int, players: int, n: int, duration: float, think_ms: float) -> Dict:
+    ws_url = base_url.replace("http", "ws", 1)
+    room_ids = [_create_room(base_url, n) for _ in range(rooms)]
+    stats = Stats()
+    deadline = time.time() + duration + 2.0  # the extra time covers connecting
+    bots = []
+    for r, room_id in enumerate(room_ids):
+        barrier = asyncio.Barrier(players)
+        for i in range(players):
+            bots.append(_bot(ws_url, room_id, i, stats, deadline, think_ms / 1000, r, barrier))
+    t0 = time.perf_counter()
+    await asyncio.gather(*bots)
+    elapsed = time.perf_counter() - t0
+    lat = sorted(stats.latencies)
+    pct = (lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] * 1000) if lat else (lambda p: 0.0)
+    return {
+        "rooms": rooms,
+        "players": players,
+        "seconds": round(elapsed, 2),
+        "messages": stats.sent + stats.received,
+        "messages_per_s": round((stats.sent + stats.received) / elapsed, 1),
+        "claims": stats.claims,
+        "claims_won": stats.won,
+        "latency_ms": {
+            "p50": round(pct(0.50), 3),
+            "p99": round(pct(0.99), 3),
+            "max": round(lat[-1] * 1000, 3) if lat else 0.0,
+            "mean": round(statistics.fmean(lat) * 1000, 3) if lat else 0.0,
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000", help="server base URL")
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4, help="bots per room")
+    parser.add_argument("--n", type=int, default=7, help="plane order of the deck")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of play")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="delay before each claim")
+    args = parser.parse_args(argv)
+    result = asyncio.run(run(args.url, args.rooms, args.players, args.n, args.duration, args.think_ms))
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+# benchmarks/run.py
+"""
+Reproducible benchmarks for plane generation, card layout, symbol lookup and PDF export.
+
+    python -m backend.benchmarks.run                      # run and compare against baseline.json
+    python -m backend.benchmarks.run --update-baseline    # run and store the results as the new baseline
+
+Every case uses fixed seeds and synthetic images, so runs differ only by machine and code.
+Exits with status 1 when a case uses more peak memory than the baseline by more than
+--threshold. Peak memory repeats exactly between runs of the same code; CPU time does not
+(on a shared host the same tree swings by 1.5x and more between runs), so slower cases are
+only reported, unless --fail-on-time asks for them to fail the run too.
+Re-record the baseline whenever a change touches measured code on purpose.
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ..routers.dobble import SymbolImage, SymbolText, _build_symbol_lookup
+from ..services.dobble_logic import generate_projective_plane
+from ..services.export_pdf import CardSpec, PageSpec, RandomSpec, RangeSpec, create_pdf, layout_card
+from ..services.layout_templates import layout_cache
+from ..services.shared_store import shared_store
+from ..services.symbol_images import image_cache
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEED = 1234
+
+# A case is (name, setup) where setup() returns the zero-argument callable to time
+Case = Tuple[str, Callable[[], Callable[[], object]]]
+
+
+# -- Fixtures --
+def _symbol_png(i: int, size: int = 256) -> bytes:
+    """Deterministic RGBA test symbol: a few colored shapes on a transparent background."""
+    rnd = random.Random(SEED + i)
+    img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        x0, y0 = rnd.randrange(size // 2), rnd.randrange(size // 2)
+        x1, y1 = x0 + rnd.randrange(size // 4, size // 2), y0 + rnd.randrange(size // 4, size // 2)
+        fill = tuple(rnd.randrange(256) for _ in range(3)) + (255,)
+        draw.ellipse((x0, y0, x1, y1), fill=fill)
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _text_symbols(count: int) -> List[SymbolText]:
+    return [SymbolText(id=f"S{i}", type="text", text=f"S{i}") for i in range(count)]
+
+
+def _image_symbols(count: int) -> List[SymbolImage]:
+    return [
+        SymbolImage(id=f"S{i}", type="image", src="data:image/png;base64," + base64.b64encode(_symbol_png(i)).decode())
+        for i in range(count)
+    ]
+
+
+def _resolved_deck(n: int, images: bool) -> List[List[Dict]]:
+    count = n * n + n + 1
+    lut = _build_symbol_lookup(_image_symbols(count) if images else _text_symbols(count))
+    ids = [f"S{i}" for i in range(count)]
+    return [[lut[ids[i]] for i in row] for row in generate_projective_plane(n)]
+
+
+def _rconf(ring_strategy: str = "single") -> RandomSpec:
+    return RandomSpec(
+        seed=SEED,
+        rotation_mode="any",
+        scale=RangeSpec(0.8, 1.2),
+        angular_jitter_deg=8.0,
+        radial_jitter_mm=1.5,
+        ring_strategy=ring_strategy,
+    )
+
+
+def _reset_caches() -> None:
+    image_cache.clear()
+    layout_cache.clear()
+
+
+# -- Cases --
+def _plane_case(n: int) -> Case:
+    return f"plane.n{n}", lambda: (lambda: generate_projective_plane(n))
+
+
+def _layout_case(n_slots: int, ring_strategy: str = "single") -> Case:
+    def setup():
+        rconf = _rconf(ring_strategy)
+
+        def run():
+            # 100 cards' worth of layouts from one seeded stream
+            rnd = random.Random(SEED)
+            for _ in range(100):
+                layout_card(n_slots, 40.0, rnd, rconf)
+
+        return run
+
+    prefix = "layout" if ring_strategy == "single" else f"layout.{ring_strategy}"
+    return f"{prefix}.slots{n_slots}", setup
+
+
+def _lookup_case(kind: str, count: int = 57) -> Case:
+    def setup():
+        symbols = _image_symbols(count) if kind == "image" else _text_symbols(count)
+
+        def run():
+            image_cache.clear()  # measure cold decoding, not cache hits
+            return _build_symbol_lookup(symbols)
+
+        return run
+
+    return f"lookup.{kind}{count}", setup
+
+
+def _pdf_case(kind: str, n: int = 7) -> Case:
+    def setup():
+        cards = _resolved_deck(n, images=kind == "image")
+        page = PageSpec(size="A4", orientation="portrait", margin_mm=10.0)
+        card = CardSpec(diameter_mm=80.0, stroke_mm=0.6, bleed_mm=0.0, per_page=6, cut_marks=True)
+        rconf = _rconf()
+
+        def run():
+            layout_cache.clear()
+            return create_pdf(cards, page, card, rconf)
+
+        return run
+
+    return f"pdf.{kind}.n{n}", setup
+
+
+def all_cases() -> List[Case]:
+    return (
+        [_plane_case(n) for n in (2, 7, 13, 23, 31)]
+        + [_layout_case(s) for s in (3, 6, 8, 12, 18, 32)]
+        + [_layout_case(s, "multi") for s in (8, 18, 32)]
+        + [_lookup_case("text"), _lookup_case("image")]
+        + [_pdf_case("text"), _pdf_case("image")]
+    )
+
+
+# -- Runner --
+# Each timed run loops the case until it takes at least this long, so microsecond cases are not all timer noise
+MIN_RUN_S = 0.05
+
+
+def measure(setup: Callable[[], Callable[[], object]], repeat: int) -> Dict[str, float]:
+    """
+    CPU and wall time per call over repeat runs, then the peak traced memory of one
+    extra call. CPU time (time.process_time) is what gets compared: unlike wall time
+    it does not grow while other processes hold the CPU. spread is how far the median
+    CPU run sits above the best one, relative to the best. tracemalloc sees Python
+    allocations only, not PIL/ReportLab C buffers.
+    """
+    _reset_caches()
+    fn = setup()
+    t0 = time.perf_counter()
+    fn()  # warm-up: imports, font registration, lru_caches
+    loops = max(1, math.ceil(MIN_RUN_S / max(time.perf_counter() - t0, 1e-9)))
+    times, cpu_times = [], []
+    for _ in range(repeat):
+        t0, c0 = time.perf_counter(), time.process_time()
+        for _ in range(loops):
+            fn()
+        cpu_times.append((time.process_time() - c0) / loops)
+        times.append((time.perf_counter() - t0) / loops)
+    # tracemalloc slows allocation-heavy code, so memory gets its own run
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    cpu_min = min(cpu_times)
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "cpu_median_s": statistics.median(cpu_times),
+        "cpu_min_s": cpu_min,
+        "spread": statistics.median(cpu_times) / cpu_min - 1 if cpu_min > 0 else 0.0,
+        "runs": repeat,
+        "loops": loops,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict],
+            threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    Human-readable (regressions, slowdowns). A regression is peak memory above
+    baseline * (1 + threshold). A slowdown is best CPU time above baseline *
+    (1 + threshold + spread), spread being the larger run-to-run spread of the two
+    runs, so a case that is noisy on this machine needs a larger slowdown to show.
+    """
+    regressions, slowdowns = [], []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        noise = max(res.get("spread", 0.0), base.get("spread", 0.0))
+        for metric, allowed, found in (("peak_kib", threshold, regressions),
+                                       ("cpu_min_s", threshold + noise, slowdowns)):
+            if base.get(metric, 0) > 0 and res[metric] > base[metric] * (1 + allowed):
+                ratio = res[metric] / base[metric]
+                found.append(f"{name}: {metric} {base[metric]:.4g} -> {res[metric]:.4g} ({ratio:.2f}x,"
+                             f" allowed {1 + allowed:.2f}x)")
+    return regressions, slowdowns
+
+
+def _meta() -> Dict[str, str]:
+    import reportlab
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "reportlab": reportlab.Version,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=15, help="timed runs per case (default 15)")
+    parser.add_argument("--only", default="", help="run only cases whose name starts with this prefix")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown/growth before a case counts as a regression (default 0.25)")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--fail-on-time", action="store_true",
+                        help="also exit 1 on CPU time slowdowns (only meaningful on a quiet, dedicated machine)")
+    args = parser.parse_args(argv)
+
+    # measure this process's own work; arrays left in the shared store by earlier runs would hide it
+    shared_store.directory = None
+    results: Dict[str, Dict] = {}
+    for name, setup in all_cases():
+        if not name.startswith(args.only):
+            continue
+        results[name] = res = measure(setup, args.repeat)
+        print(f"{name:<22} {res['cpu_median_s'] * 1000:10.3f} ms cpu  (min {res['cpu_min_s'] * 1000:.3f},"
+              f" spread {res['spread']:5.1%})  wall {res['median_s'] * 1000:10.3f} ms"
+              f"  peak {res['peak_kib']:10.1f} KiB")
+
+    report = {"meta": _meta(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    regressions, slowdowns = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    for line in slowdowns:
+        print(f"{'REGRESSION' if args.fail_on_time else 'SLOWER'} {line}")
+    failed = regressions + (slowdowns if args.fail_on_time else [])
+    if not failed:
+        print(f"no regressions against baseline (threshold {args.threshold:.0%})")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,49 @@
+import ipaddress
 import os
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from backend.routers import dobble
+from backend.services.dobble_logic import deck_cache
+from backend.services.symbol_images import image_cache
+from backend.services.export_jobs import export_jobs
+from backend.services.fonts import font_registry
+from backend.services.result_cache import result_cache
+from backend.services import metrics
 
-app = FastAPI(title="Dobble API")
+# Deck cache budget and orders to pre-build at startup ("" disables warm-up)
+DECK_CACHE_MAX_BYTES = int(os.getenv("DECK_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+DECK_CACHE_WARM_ORDERS = [int(n) for n in os.getenv("DECK_CACHE_WARM_ORDERS", "2,3,4,5,7").split(",") if n.strip()]
+# Budget for decoded symbol images shared across exports
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Background export jobs: renders running at once, and how many may wait behind them
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+EXPORT_JOB_QUEUE_DEPTH = int(os.getenv("EXPORT_JOB_QUEUE_DEPTH", "16"))
+# Disk budget for cached PDFs of seeded exports
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Log exports slower than this with their per-stage timings (0 disables)
+SLOW_EXPORT_LOG_MS = float(os.getenv("SLOW_EXPORT_LOG_MS", "0"))
+# /metrics answers loopback clients only unless this is set (e.g. for a scraper on another host)
+METRICS_ALLOW_REMOTE = os.getenv("METRICS_ALLOW_REMOTE", "0") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    deck_cache.max_bytes = DECK_CACHE_MAX_BYTES
+    deck_cache.warm(DECK_CACHE_WARM_ORDERS)
+    image_cache.max_bytes = IMAGE_CACHE_MAX_BYTES
+    export_jobs.max_workers = EXPORT_JOB_WORKERS
+    export_jobs.max_queued = EXPORT_JOB_QUEUE_DEPTH
+    result_cache.max_bytes = EXPORT_CACHE_MAX_BYTES
+    metrics.SLOW_EXPORT_LOG_MS = SLOW_EXPORT_LOG_MS
+    font_registry.load()
+    yield
+    export_jobs.shutdown()
+
+
+app = FastAPI(title="Dobble API", lifespan=lifespan)
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "https://dobble-app.onrender.com")
 ALLOWED_ORIGINS = [
@@ -23,6 +63,27 @@ app.add_middleware(
 app.include_router(dobble.router)
 
 
+@app.middleware("http")
+async def mark_received(request: Request, call_next):
+    # lets handlers split their latency into body parsing/validation and their own work
+    request.state.received_at = time.perf_counter()
+    return await call_next(request)
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request):
+    if not METRICS_ALLOW_REMOTE and not (request.client and _is_loopback(request.client.host)):
+        raise HTTPException(status_code=403, detail="Metrics are only served to local clients")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 def root():
     return {"message": "Dobble API running!"}
@@ -1,9 +1,35 @@
-from fastapi import APIRouter, Query, HTTPException, Response
-from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import List, Literal, Optional, Dict, Union
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import zipfile
 
-from ..services.dobble_logic import get_params, generate_projective_plane as gen_plane
-from ..services.export_pdf import (PageSpec, CardSpec, RandomSpec, RangeSpec, create_pdf, _decode_data_url)
+from fastapi import APIRouter, Header, Query, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocketState
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+from typing import Annotated, Any, List, Literal, Optional, Dict, Tuple, Union
+
+import numpy as np
+
+from ..services.dobble_logic import (get_params, get_plane as gen_plane, iter_projective_plane, deck_cache,
+                                     pack_deck, get_index, index_cache, check_deck, VALID_ORDERS,
+                                     PACKED_DECK_MEDIA_TYPE)
+from ..services.export_pdf import (PageSpec, CardSpec, RandomSpec, RangeSpec, create_pdf, write_pdf,
+                                  spool_pdf, iter_chunks, image_stats, submit_pdf)
+from ..services.metrics import EXPORT_REQUEST_BYTES, EXPORT_RESPONSE_BYTES, EXPORTS, PREVIEW_STAGE_SECONDS, StageTimer
+from ..services.preview import preview_cache, render_preview
+from ..services.deck_sessions import DeckSession, TooManySessions, deck_sessions
+from ..services.fonts import UnknownFont, font_registry
+from ..services.game import GameError, Room, TooManyRooms, game_rooms
+from ..services.export_jobs import ExportJob, QueueFull, export_jobs
+from ..services.result_cache import result_cache
+from ..services.shared_store import shared_store
+from ..services.symbol_images import (data_url_key, load_data_url, load_ref, register_image, image_cache,
+                                      ImageTooLarge, INVALID_IMAGE_ERRORS, SYMBOL_MAX_UPLOAD_BYTES)
 from ..variables.varsForApiExamples import (symbol, cards, symbols)
 
 router = APIRouter(prefix="/dobble", tags=["dobble"])
@@ -65,6 +91,43 @@ def validate(
     )
 
 
+# -- Deck validation --
+# Hand-edited decks are checked with one incidence-matrix product (see dobble_logic.check_deck)
+VALIDATE_MAX_CARDS = 2048
+VALIDATE_MAX_SYMBOLS_PER_CARD = 64  # order 31, the largest plane, has 32
+
+
+class DeckCheckRequest(BaseModel):
+    cards: List[Annotated[List[str], Field(max_length=VALIDATE_MAX_SYMBOLS_PER_CARD)]] = Field(
+        ..., max_length=VALIDATE_MAX_CARDS)
+    max_pairs: int = Field(default=100, ge=0, le=10_000, alias="maxPairs")
+
+    model_config = {
+        "populate_by_name": True
+    }
+
+
+class BadPair(ApiResponse):
+    card_a: int = Field(alias="cardA")
+    card_b: int = Field(alias="cardB")
+    shared: int  # symbols the two cards have in common (valid decks: exactly 1)
+    symbols: List[str]
+
+
+class DeckCheck(ApiResponse):
+    valid: bool
+    num_cards: int = Field(alias="numCards")
+    num_symbols: int = Field(alias="numSymbols")
+    bad_pairs: int = Field(alias="badPairs")  # total; pairs lists at most maxPairs of them
+    pairs: List[BadPair]
+    duplicate_cards: List[int] = Field(alias="duplicateCards")  # cards showing a symbol twice
+
+
+@router.post("/validate/deck", response_model=DeckCheck)
+def validate_deck(req: DeckCheckRequest):
+    return check_deck(req.cards, max_pairs=req.max_pairs)
+
+
 class GenerateRequest(BaseModel):
     n: int = Field(..., ge=2)
     symbols: List[str] = Field(default=symbol)  # length must be n^2 + n + 1
@@ -76,15 +139,82 @@ class GenerateResponse(ApiResponse):
     cards: List[List[str]] = Field(default=cards, alias="cards")
 
 
-@router.post("/generate", response_model=GenerateResponse)
-def generate(req: GenerateRequest):
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# ?format= value for each media type /generate can answer with; the first is the default
+_GENERATE_FORMATS = {"application/json": "json", PACKED_DECK_MEDIA_TYPE: "packed", NDJSON_MEDIA_TYPE: "ndjson"}
+
+
+def _accept_quality(accept: str, media_type: str) -> float:
+    """q-value the Accept header gives media_type, taken from its most specific matching range."""
+    main_type = media_type.split("/")[0]
+    best, quality = -1, 0.0
+    for part in accept.split(","):
+        media_range, *params = [p.strip() for p in part.split(";")]
+        media_range = media_range.lower()
+        if media_range == media_type:
+            specificity = 2
+        elif media_range == f"{main_type}/*":
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if specificity > best:
+            best, quality = specificity, q
+    return quality
+
+
+def _negotiate_format(accept: Optional[str]) -> str:
+    """The ?format= value for the media type the client prefers; JSON on ties or no match."""
+    if not accept:
+        return "json"
+    q, _, fmt = max((_accept_quality(accept, media_type), -i, fmt)
+                    for i, (media_type, fmt) in enumerate(_GENERATE_FORMATS.items()))
+    return fmt if q > 0 else "json"
+
+
+@router.post("/generate", response_model=GenerateResponse,
+             responses={200: {"content": {PACKED_DECK_MEDIA_TYPE: {}, NDJSON_MEDIA_TYPE: {}}}})
+def generate(
+        req: GenerateRequest,
+        fmt: Optional[Literal["json", "packed", "ndjson"]] = Query(None, alias="format"),
+        accept: Optional[str] = Header(default=None),
+):
+    if req.n not in VALID_ORDERS:
+        raise HTTPException(status_code=400, detail=f"No projective plane of order {req.n} is supported")
     expected = req.n ** 2 + req.n + 1
     if len(req.symbols) != expected:
         raise ValueError(f"Expected {expected} symbols, got {len(req.symbols)}")
+    # an explicit ?format= wins over the Accept header
+    fmt = fmt or _negotiate_format(accept)
+
+    # ndjson: stream one card (JSON array of symbols) per line straight off the plane construction
+    if fmt == "ndjson":
+        symbols = req.symbols
+
+        def lines():
+            for card in iter_projective_plane(req.n):
+                yield json.dumps([symbols[i] for i in card], ensure_ascii=False) + "\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
 
     card_idx = gen_plane(req.n)
 
-    cards = [[req.symbols[i] for i in card] for card in card_idx]
+    # packed: uint16 index rows plus the symbol list once (see dobble_logic.pack_deck)
+    if fmt == "packed":
+        return Response(content=pack_deck(card_idx, req.symbols), media_type=PACKED_DECK_MEDIA_TYPE)
+
+    # map the whole index array to symbol strings in one pass
+    cards = np.asarray(req.symbols, dtype=object)[card_idx].tolist()
 
     return {
         "symbols_per_card": req.n + 1,
@@ -93,6 +223,68 @@ def generate(req: GenerateRequest):
     }
 
 
+class CacheStats(ApiResponse):
+    entries: int
+    bytes: int
+    max_bytes: int = Field(alias="maxBytes")
+    hits: int
+    misses: int
+    evictions: int
+
+
+class DeckCacheStats(CacheStats):
+    orders: List[int]
+
+
+@router.get("/cache/decks", response_model=DeckCacheStats)
+def deck_cache_stats():
+    return deck_cache.stats()
+
+
+@router.get("/cache/images", response_model=CacheStats)
+def image_cache_stats():
+    return image_cache.stats()
+
+
+@router.get("/cache/exports", response_model=CacheStats)
+def export_cache_stats():
+    return result_cache.stats()
+
+
+@router.get("/cache/indexes", response_model=CacheStats)
+def index_cache_stats():
+    return index_cache.stats()
+
+
+class SharedStoreStats(ApiResponse):
+    enabled: bool
+    directory: Optional[str] = None
+    entries: int
+    bytes: int
+
+
+@router.get("/cache/previews", response_model=CacheStats)
+def preview_cache_stats():
+    return preview_cache.stats()
+
+
+@router.get("/cache/shared", response_model=SharedStoreStats)
+def shared_store_stats():
+    return shared_store.stats()
+
+
+# -- Fonts --
+class FontFace(ApiResponse):
+    family: str  # lower-cased; fontFamily matches it case-insensitively
+    weight: int
+    name: str  # ReportLab font name, also accepted as fontFamily
+
+
+@router.get("/fonts", response_model=List[FontFace])
+def list_fonts():
+    return [FontFace(family=family, weight=weight, name=name) for family, weight, name in font_registry.faces()]
+
+
 # -- Export PDF --
 class SymbolText(BaseModel):
     id: str
@@ -109,7 +301,14 @@ class SymbolText(BaseModel):
 class SymbolImage(BaseModel):
     id: str
     type: Literal["image"]
-    src: str  # data: URL
+    src: Optional[str] = None  # data: URL
+    ref: Optional[str] = None  # content ID returned by POST /dobble/symbols
+
+    @model_validator(mode="after")
+    def check_source(cls, values):
+        if (values.src is None) == (values.ref is None):
+            raise ValueError("image symbol needs exactly one of 'src' or 'ref'")
+        return values
 
 
 SymbolDef = Union[SymbolText, SymbolImage]
@@ -131,6 +330,7 @@ class CardOpts(BaseModel):
     bleed_mm: float = Field(default=0.0, alias="bleedMm")
     per_page: int = Field(default=2, alias="perPage")
     cut_marks: bool = Field(default=True, alias="cutMarks")
+    image_dpi: Optional[int] = Field(default=300, ge=72, alias="imageDpi")  # null embeds images unscaled
 
     model_config = {
         "populate_by_name": True
@@ -148,9 +348,13 @@ class RandomOpts(BaseModel):
     scale: RangeModel = RangeModel(min=0.8, max=1.1)
     angular_jitter_deg: float = Field(default=6.0, alias="angularJitterDeg")
     radial_jitter_mm: float = Field(default=1.5, alias="radialJitterMm")
-    ring_strategy: Literal["single"] = Field(default="single", alias="ringStrategy")
+    ring_strategy: Literal["single", "multi"] = Field(default="single", alias="ringStrategy")
     rotation_mode: Literal["bounded"] = Field(default="bounded", alias="rotationMode")
     steps_deg: Optional[float] = Field(default=None, alias="stepsDeg")
+    layout_pool: int = Field(default=0, ge=0, le=256, alias="layoutPool")  # reuse N precomputed layouts (needs seed)
+    # per-card budget of the "multi" strategy: candidate layouts, and wall time (0: none)
+    layout_iterations: int = Field(default=16, ge=1, le=64, alias="layoutIterations")
+    layout_budget_ms: float = Field(default=0.0, ge=0, le=1000, alias="layoutBudgetMs")
 
     model_config = {
         "populate_by_name": True
@@ -177,7 +381,8 @@ class ExportRequest(BaseModel):
     num_cards: int = Field(default=7, alias="numCards")
     cards: List[List[str]] = Field(default=cards, alias="cards")
     symbols: List[SymbolDef] = Field(
-        default=symbols, alias="symbols")  # for educational purposes, we keep the original symbol list of texts
+        default=symbols, alias="symbols",
+        validate_default=True)  # for educational purposes, we keep the original symbol list of texts
     page: PageOpts = PageOpts()
     card: CardOpts = CardOpts()
     randomization: RandomOpts = RandomOpts()
@@ -203,115 +408,877 @@ class ExportError(ApiResponse):
     }
 
 
+class SymbolUploadResponse(ApiResponse):
+    ref: str
+    width: int
+    height: int
+    bytes: int
+
+
+@router.post("/symbols", response_model=SymbolUploadResponse, responses={400: {"model": ExportError}})
+async def upload_symbol(request: Request):
+    # raw image bytes in the body (e.g. Content-Type: image/png); oversized bodies are refused before reading
+    too_large = HTTPException(status_code=413, detail=f"Image exceeds {SYMBOL_MAX_UPLOAD_BYTES} bytes")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > SYMBOL_MAX_UPLOAD_BYTES:
+        raise too_large
+    chunks: List[bytes] = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > SYMBOL_MAX_UPLOAD_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    raw = b"".join(chunks)
+    if not raw:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    try:
+        return await run_in_threadpool(register_image, raw)
+    except ImageTooLarge as exc:
+        # the pixel count is only known once the header is parsed, so it is a 400 rather than a 413
+        raise HTTPException(status_code=400, detail=str(exc))
+    except INVALID_IMAGE_ERRORS:
+        raise HTTPException(status_code=400, detail="Invalid or unsupported image")
+
+
 def _build_symbol_lookup(symbols: List[SymbolDef]) -> Dict[str, Dict]:
     lut: Dict[str, Dict] = {}
     for symbol in symbols:
         if isinstance(symbol, SymbolText):
-            lut[symbol.id] = {"type": "text", "text": symbol.text, "font_family": symbol.font_family}
+            try:
+                font = font_registry.resolve(symbol.font_family, symbol.font_weight)
+            except UnknownFont:
+                raise HTTPException(status_code=400,
+                                    detail=f"Unknown font family '{symbol.font_family}' for symbol '{symbol.id}'")
+            lut[symbol.id] = {"type": "text", "text": symbol.text, "font_family": symbol.font_family, "font": font}
+            continue
+        if symbol.ref is not None:
+            try:
+                img = load_ref(symbol.ref)
+            except (KeyError, ValueError):
+                raise HTTPException(status_code=400,
+                                    detail=f"Unknown image ref '{symbol.ref}' for symbol '{symbol.id}', "
+                                           "re-upload it via POST /dobble/symbols")
         else:
             try:
-                img = _decode_data_url(symbol.src)
-            except Exception:
+                img = load_data_url(symbol.src)
+            except ImageTooLarge as exc:
+                raise HTTPException(status_code=400, detail=f"{exc} (symbol '{symbol.id}')")
+            except INVALID_IMAGE_ERRORS:
                 raise HTTPException(status_code=400,
                                     detail=f"Invalid or unsupported image for symbol '{symbol.id}' (expect data: URL)")
-            lut[symbol.id] = {"type": "image", "image": img}
+        lut[symbol.id] = {"type": "image", "image": img}
     return lut
 
 
-@router.post("/export/pdf", responses={400: {"model": ExportError}})
-def export_pdf(req: ExportRequest):
+def _resolve_export(
+        req: ExportRequest,
+        timer: Optional[StageTimer] = None,
+) -> Tuple[List[List[Dict]], PageSpec, CardSpec, RandomSpec]:
+    timer = timer or StageTimer()
     # 1) Build symbol lookup (id -> resolved dict)
-    lut = _build_symbol_lookup(req.symbols)
+    with timer.stage("symbol_lookup"):
+        lut = _build_symbol_lookup(req.symbols)
 
     # 2) Validate & resolve cards (ids -> symbol dicts)
-    resolved_cards: List[List[Dict]] = []
-    for ci, card_ids in enumerate(req.cards):
-        if len(card_ids) != req.symbols_per_card:
-            raise HTTPException(status_code=400, detail=f"Card {ci} length mismatch")
-        resolved = []
-        for sid in card_ids:
-            if sid not in lut:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Symbol '{sid}' referenced on card {ci} but not provided"
-                )
-            resolved.append(lut[sid])
-        resolved_cards.append(resolved)
+    with timer.stage("card_resolution"):
+        resolved_cards: List[List[Dict]] = []
+        for ci, card_ids in enumerate(req.cards):
+            if len(card_ids) != req.symbols_per_card:
+                raise HTTPException(status_code=400, detail=f"Card {ci} length mismatch")
+            resolved = []
+            for sid in card_ids:
+                if sid not in lut:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Symbol '{sid}' referenced on card {ci} but not provided"
+                    )
+                resolved.append(lut[sid])
+            resolved_cards.append(resolved)
 
-    # 3) Convert PageOpts -> PageSpec
-    if isinstance(req.page.size, str):
-        page_size = req.page.size  # "A4" | "Letter"
-    else:
-        # Accept multiple key styles for custom size
-        size_dict = req.page.size
-        # common variants
-        w = (
-                size_dict.get("w_mm")
-                or size_dict.get("w")
-                or size_dict.get("width_mm")
-                or size_dict.get("width")
-                or size_dict.get("wMm")
-                or size_dict.get("widthMm")
+    # options.validate: reject decks where some pair of cards does not share exactly one symbol
+    if req.options.get("validate"):
+        with timer.stage("deck_check"):
+            _check_export_deck(req.cards)
+
+    page, card, rnd = _export_specs(req, timer)
+    return resolved_cards, page, card, rnd
+
+
+def _check_export_deck(cards: List[List[str]]) -> None:
+    if len(cards) > VALIDATE_MAX_CARDS or any(len(c) > VALIDATE_MAX_SYMBOLS_PER_CARD for c in cards):
+        raise HTTPException(
+            status_code=400,
+            detail=f"options.validate checks at most {VALIDATE_MAX_CARDS} cards "
+                   f"of at most {VALIDATE_MAX_SYMBOLS_PER_CARD} symbols"
         )
-        h = (
-                size_dict.get("h_mm")
-                or size_dict.get("h")
-                or size_dict.get("height_mm")
-                or size_dict.get("height")
-                or size_dict.get("hMm")
-                or size_dict.get("heightMm")
+    result = check_deck(cards, max_pairs=1)
+    if result["duplicate_cards"]:
+        raise HTTPException(status_code=400, detail=f"Card {result['duplicate_cards'][0]} repeats a symbol")
+    if result["pairs"]:
+        pair = result["pairs"][0]
+        raise HTTPException(
+            status_code=400,
+            detail=f"{result['bad_pairs']} card pairs do not share exactly one symbol "
+                   f"(first: cards {pair['card_a']} and {pair['card_b']} share {pair['shared']})"
+        )
+
+
+def _export_specs(req: ExportRequest, timer: Optional[StageTimer] = None) -> Tuple[PageSpec, CardSpec, RandomSpec]:
+    timer = timer or StageTimer()
+    # 3) Convert PageOpts -> PageSpec
+    with timer.stage("page_conversion"):
+        if isinstance(req.page.size, str):
+            page_size = req.page.size  # "A4" | "Letter"
+        else:
+            # Accept multiple key styles for custom size
+            size_dict = req.page.size
+            # common variants
+            w = (
+                    size_dict.get("w_mm")
+                    or size_dict.get("w")
+                    or size_dict.get("width_mm")
+                    or size_dict.get("width")
+                    or size_dict.get("wMm")
+                    or size_dict.get("widthMm")
+            )
+            h = (
+                    size_dict.get("h_mm")
+                    or size_dict.get("h")
+                    or size_dict.get("height_mm")
+                    or size_dict.get("height")
+                    or size_dict.get("hMm")
+                    or size_dict.get("heightMm")
+            )
+            if w is None or h is None:
+                raise HTTPException(status_code=400, detail="Custom page.size must include width/height in mm")
+            # custom size tuple (w_mm, h_mm)
+            page_size = (float(w), float(h))
+
+        page = PageSpec(
+            size=page_size,
+            orientation=req.page.orientation,
+            margin_mm=req.page.margin_mm,
         )
-        if w is None or h is None:
-            raise HTTPException(status_code=400, detail="Custom page.size must include width/height in mm")
-        # custom size tuple (w_mm, h_mm)
-        page_size = (float(w), float(h))
-
-    page = PageSpec(
-        size=page_size,
-        orientation=req.page.orientation,
-        margin_mm=req.page.margin_mm,
-    )
 
     # 4) Convert CardOpts -> CardSpec
-    card = CardSpec(
-        diameter_mm=req.card.diameter_mm,
-        stroke_mm=req.card.stroke_mm,
-        bleed_mm=req.card.bleed_mm,
-        per_page=req.card.per_page,
-        cut_marks=req.card.cut_marks,
-    )
+    with timer.stage("card_conversion"):
+        # create_pdf enforces the same limit, but streamed and batch exports only call it
+        # after the response has started, so reject it here with a proper 400
+        if not 1 <= req.card.per_page <= 6:
+            raise HTTPException(status_code=400, detail="card.perPage must be between 1 and 6")
+        card = CardSpec(
+            diameter_mm=req.card.diameter_mm,
+            stroke_mm=req.card.stroke_mm,
+            bleed_mm=req.card.bleed_mm,
+            per_page=req.card.per_page,
+            cut_marks=req.card.cut_marks,
+            image_dpi=req.card.image_dpi,
+        )
 
     # 5) Convert RandomOpts (Pydantic) -> RandomSpec (dataclass)
-    rnd = RandomSpec(
-        seed=req.randomization.seed,
-        rotation_deg=RangeSpec(
-            min=req.randomization.rotation_deg.min,
-            max=req.randomization.rotation_deg.max
-        ),
-        scale=RangeSpec(
-            min=req.randomization.scale.min,
-            max=req.randomization.scale.max
-        ),
-        angular_jitter_deg=req.randomization.angular_jitter_deg,
-        radial_jitter_mm=req.randomization.radial_jitter_mm,
-        ring_strategy=req.randomization.ring_strategy,
-        rotation_mode=req.randomization.rotation_mode,  # "any" | "bounded" | "steps90" | "steps"
-        steps_deg=req.randomization.steps_deg,
-    )
+    with timer.stage("randomization"):
+        rnd = RandomSpec(
+            seed=req.randomization.seed,
+            rotation_deg=RangeSpec(
+                min=req.randomization.rotation_deg.min,
+                max=req.randomization.rotation_deg.max
+            ),
+            scale=RangeSpec(
+                min=req.randomization.scale.min,
+                max=req.randomization.scale.max
+            ),
+            angular_jitter_deg=req.randomization.angular_jitter_deg,
+            radial_jitter_mm=req.randomization.radial_jitter_mm,
+            ring_strategy=req.randomization.ring_strategy,
+            rotation_mode=req.randomization.rotation_mode,  # "any" | "bounded" | "steps90" | "steps"
+            steps_deg=req.randomization.steps_deg,
+            layout_pool=req.randomization.layout_pool,
+            layout_iterations=req.randomization.layout_iterations,
+            layout_budget_ms=req.randomization.layout_budget_ms,
+        )
+    return page, card, rnd
 
-    # 6) Render PDF
-    pdf_bytes = create_pdf(
-        cards=resolved_cards,
-        page=page,
-        card=card,
-        rconf=rnd,
-        fonts=None,
-    )
 
-    # 7) Return file
+def _export_headers(resolved_cards: List[List[Dict]], rnd: RandomSpec) -> Dict[str, str]:
+    img_stats = image_stats(resolved_cards)
     headers = {
         "Content-Disposition": 'attachment; filename="dobble_cards.pdf"',
         # Optionally echo seed for reproducibility:
         "X-Seed": str(rnd.seed or 0),
+        # each distinct image is embedded once and referenced on every card that shows it
+        "X-Images-Placed": str(img_stats.placed),
+        "X-Images-Embedded": str(img_stats.embedded),
+        "X-Image-Dedup-Ratio": f"{img_stats.dedup_ratio:.2f}",
     }
+    return headers
+
+
+# Bump when rendering changes so cached PDFs from older code are not served
+RENDER_VERSION = 1
+
+
+def _export_fingerprint(req: ExportRequest) -> Optional[str]:
+    """
+    Canonical hash of everything that shapes the PDF, or None when the output is
+    not reproducible (no fixed seed). Inline images count by content hash;
+    transport options (stream, workers) are ignored.
+    """
+    if not req.randomization.seed:
+        return None
+    data = req.model_dump(mode="json")
+    data["options"] = {k: v for k, v in data["options"].items() if k not in ("stream", "workers")}
+    for sym in data["symbols"]:
+        if sym.get("src"):
+            sym["src"] = data_url_key(sym["src"])
+    data["symbols"].sort(key=lambda sym: sym["id"])
+    data["version"] = RENDER_VERSION
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@router.post("/export/pdf", responses={304: {"description": "Not modified"}, 400: {"model": ExportError}})
+def export_pdf(request: Request, req: ExportRequest, if_none_match: Optional[str] = Header(default=None)):
+    # time since the request arrived covers receiving the body and Pydantic validation
+    received_at = getattr(request.state, "received_at", None)
+    timer = StageTimer(received_at)
+    if received_at is not None:
+        timer.record("parse", time.perf_counter() - received_at)
+    EXPORT_REQUEST_BYTES.inc(int(request.headers.get("content-length") or 0))
+    try:
+        response, result = _export_pdf(req, if_none_match, timer)
+    except HTTPException:
+        EXPORTS.inc(result="invalid")
+        timer.finish("export (invalid)")
+        raise
+    except Exception:
+        EXPORTS.inc(result="error")
+        timer.finish("export (failed)")
+        raise
+    EXPORTS.inc(result=result)
+    timer.finish(f"export ({result}, {len(req.cards)} cards)")
+    return response
+
+
+def _export_pdf(req: ExportRequest, if_none_match: Optional[str], timer: StageTimer) -> Tuple[Response, str]:
+    # 0) Seeded exports are cached by fingerprint and revalidated via ETag
+    with timer.stage("fingerprint"):
+        fingerprint = _export_fingerprint(req)
+    if fingerprint:
+        etag = f'"{fingerprint}"'
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag}), "not_modified"
+        cached = result_cache.get(fingerprint)
+        if cached:
+            path, cached_headers = cached
+            EXPORT_RESPONSE_BYTES.inc(os.path.getsize(path))
+            headers = {**cached_headers, "ETag": etag}
+            return FileResponse(path, media_type="application/pdf", headers=headers), "cached"
+
+    # 1-5) Resolve symbols, cards, page, card and randomization specs
+    resolved_cards, page, card, rnd = _resolve_export(req, timer)
+    headers = _export_headers(resolved_cards, rnd)
+
+    # options.workers > 1 renders page chunks in worker processes and merges them in order
+    workers = max(1, int(req.options.get("workers", 1)))
+
+    # 6+7) Cacheable: render straight into the result cache and serve the file
+    if fingerprint:
+        with timer.stage("render"):
+            path = result_cache.put(
+                fingerprint,
+                lambda out: write_pdf(out, resolved_cards, page, card, rnd, fonts=None, workers=workers),
+                headers,
+            )
+        EXPORT_RESPONSE_BYTES.inc(os.path.getsize(path))
+        headers = {**headers, "ETag": f'"{fingerprint}"'}
+        return FileResponse(path, media_type="application/pdf", headers=headers), "rendered"
+
+    # 6+7) options.stream: render into a spooled temp file and stream it back in chunks
+    if req.options.get("stream"):
+        with timer.stage("render"):
+            spool = spool_pdf(
+                cards=resolved_cards,
+                page=page,
+                card=card,
+                rconf=rnd,
+                fonts=None,
+                workers=workers,
+            )
+        EXPORT_RESPONSE_BYTES.inc(spool.seek(0, os.SEEK_END))
+        spool.seek(0)
+        return StreamingResponse(iter_chunks(spool), media_type="application/pdf", headers=headers), "rendered"
+
+    # 6) Render PDF
+    with timer.stage("render"):
+        pdf_bytes = create_pdf(
+            cards=resolved_cards,
+            page=page,
+            card=card,
+            rconf=rnd,
+            fonts=None,
+            workers=workers,
+        )
+
+    # 7) Return file
+    with timer.stage("response"):
+        EXPORT_RESPONSE_BYTES.inc(len(pdf_bytes))
+        response = Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+    return response, "rendered"
+
+
+# -- Export jobs --
+class ExportJobStatus(ApiResponse):
+    id: str
+    status: Literal["queued", "running", "done", "failed"]
+    cards_drawn: int = Field(alias="cardsDrawn")
+    total_cards: int = Field(alias="totalCards")
+    error: Optional[str] = None
+    result_url: Optional[str] = Field(default=None, alias="resultUrl")
+
+
+def _job_status(job: ExportJob) -> ExportJobStatus:
+    return ExportJobStatus(
+        id=job.id,
+        status=job.status,
+        cards_drawn=job.drawn,
+        total_cards=job.total,
+        error=job.error,
+        result_url=f"{router.prefix}/export/jobs/{job.id}/result" if job.status == "done" else None,
+    )
+
+
+@router.post("/export/jobs", status_code=202, response_model=ExportJobStatus,
+             responses={400: {"model": ExportError}, 503: {"model": ExportError}})
+def create_export_job(req: ExportRequest):
+    # validation happens up front so bad requests fail fast instead of as a failed job
+    resolved_cards, page, card, rnd = _resolve_export(req)
+    workers = max(1, int(req.options.get("workers", 1)))
+
+    def render(out, progress):
+        write_pdf(out, resolved_cards, page, card, rnd, fonts=None, workers=workers, progress=progress)
+
+    try:
+        job = export_jobs.submit(render, total=len(resolved_cards), headers=_export_headers(resolved_cards, rnd))
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Export queue is full, retry later",
+                            headers={"Retry-After": "5"})
+    return _job_status(job)
+
+
+@router.get("/export/jobs/{job_id}", response_model=ExportJobStatus, responses={404: {"model": ExportError}})
+def get_export_job(job_id: str):
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export job '{job_id}'")
+    return _job_status(job)
+
+
+@router.get("/export/jobs/{job_id}/result", responses={404: {"model": ExportError}, 409: {"model": ExportError}})
+def download_export_job(job_id: str):
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export job '{job_id}'")
+    if job.status != "done" or not job.result_path:
+        raise HTTPException(status_code=409, detail=f"Export job '{job_id}' is {job.status}")
+    return FileResponse(job.result_path, media_type="application/pdf", headers=job.headers)
+
+
+# -- Batch export --
+# Most decks, and most cards across all decks, one batch request may hold
+BATCH_MAX_ITEMS = 100
+BATCH_MAX_CARDS = 10_000
+
+_ZIP_NAME_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class BatchItem(BaseModel):
+    name: Optional[str] = None  # file name inside the zip, defaults to deck_01.pdf, ...
+    generate: Optional[GenerateRequest] = None  # build cards server-side from n + symbol ids
+    export: ExportRequest = ExportRequest()
+
+
+class BatchExportRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+class _ZipStream:
+    """Write-only sink for zipfile that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def write(self, data: bytes) -> int:
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def _batch_export_request(item: BatchItem) -> ExportRequest:
+    if item.generate is None:
+        return item.export
+    gen = item.generate
+    if gen.n not in VALID_ORDERS:
+        raise HTTPException(status_code=400, detail=f"No projective plane of order {gen.n} is supported")
+    expected = gen.n ** 2 + gen.n + 1
+    if len(gen.symbols) != expected:
+        raise HTTPException(status_code=400, detail=f"Expected {expected} symbols, got {len(gen.symbols)}")
+    # planes come from the shared deck cache, so equal orders across items are built once
+    cards = np.asarray(gen.symbols, dtype=object)[gen_plane(gen.n)].tolist()
+    return item.export.model_copy(update={
+        "n": gen.n,
+        "symbols_per_card": gen.n + 1,
+        "num_cards": expected,
+        "cards": cards,
+    })
+
+
+def _zip_names(items: List[BatchItem]) -> List[str]:
+    names: List[str] = []
+    seen = set()
+    for i, item in enumerate(items):
+        stem = _ZIP_NAME_RE.sub("_", item.name or "").strip("._") or f"deck_{i + 1:02d}"
+        if stem.lower().endswith(".pdf"):
+            stem = stem[:-4]
+        name, k = f"{stem}.pdf", 2
+        while name in seen:
+            name, k = f"{stem}_{k}.pdf", k + 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+@router.post("/batch/export", responses={200: {"content": {"application/zip": {}}}, 400: {"model": ExportError}})
+def batch_export(req: BatchExportRequest):
+    # resolve every item before streaming starts, so a bad item still gets a proper 400
+    exports = []
+    for i, item in enumerate(req.items):
+        try:
+            exports.append(_batch_export_request(item))
+        except HTTPException as exc:
+            raise HTTPException(status_code=exc.status_code, detail=f"Item {i}: {exc.detail}")
+    total_cards = sum(len(export.cards) for export in exports)
+    if total_cards > BATCH_MAX_CARDS:
+        raise HTTPException(status_code=400,
+                            detail=f"Batch holds {total_cards} cards, at most {BATCH_MAX_CARDS} are allowed")
+    jobs = []
+    for i, export in enumerate(exports):
+        try:
+            jobs.append(_resolve_export(export))
+        except HTTPException as exc:
+            raise HTTPException(status_code=exc.status_code, detail=f"Item {i}: {exc.detail}")
+    names = _zip_names(req.items)
+
+    def stream():
+        sink = _ZipStream()
+        # decks render side by side in the worker processes of the export pool
+        futures = [submit_pdf(resolved_cards, page, card, rnd) for resolved_cards, page, card, rnd in jobs]
+        try:
+            # PDFs are already compressed, so store them; emit each entry as soon as it is ready
+            with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+                for name, fut in zip(names, futures):
+                    zf.writestr(name, fut.result())
+                    yield sink.drain()
+            yield sink.drain()
+        finally:
+            # a client that disconnects stops the decks not yet started
+            for fut in futures:
+                fut.cancel()
+
+    headers = {"Content-Disposition": 'attachment; filename="dobble_decks.zip"'}
+    return StreamingResponse(stream(), media_type="application/zip", headers=headers)
+
+
+# -- Previews --
+PREVIEW_MAX_CARDS = 64
+
+
+class PreviewRequest(ExportRequest):
+    card_indices: List[int] = Field(default=[0], min_length=1, max_length=PREVIEW_MAX_CARDS, alias="cardIndices")
+    size: int = Field(default=160, ge=32, le=512)  # pixels per card
+    format: Literal["png", "webp"] = "png"
+
+
+@router.post("/preview", responses={200: {"content": {"image/png": {}, "image/webp": {}}},
+                                    400: {"model": ExportError}})
+def preview(req: PreviewRequest):
+    """
+    Rasterize cards as the PDF lays them out: one card, or a contact sheet of
+    several. Only the requested cards are resolved and drawn.
+    """
+    timer = StageTimer(histogram=PREVIEW_STAGE_SECONDS)
+    for ci in req.card_indices:
+        if not 0 <= ci < len(req.cards):
+            raise HTTPException(status_code=400, detail=f"Card {ci} out of range 0..{len(req.cards) - 1}")
+    with timer.stage("symbol_lookup"):
+        # decode only the symbols on the previewed cards, not every image of the deck
+        used = {sid for ci in req.card_indices for sid in req.cards[ci]}
+        lut = _build_symbol_lookup([sym for sym in req.symbols if sym.id in used])
+    with timer.stage("card_resolution"):
+        resolved: Dict[int, List[Dict]] = {}
+        for ci in req.card_indices:
+            missing = next((sid for sid in req.cards[ci] if sid not in lut), None)
+            if missing is not None:
+                raise HTTPException(status_code=400,
+                                    detail=f"Symbol '{missing}' referenced on card {ci} but not provided")
+            resolved[ci] = [lut[sid] for sid in req.cards[ci]]
+    _, card, rnd = _export_specs(req, timer)
+    with timer.stage("rasterize"):
+        content, hits = render_preview(resolved, card, rnd, req.size, req.format)
+    timer.finish(f"preview ({len(resolved)} cards, {hits} cached)")
+    headers = {"X-Seed": str(rnd.seed or 0), "X-Preview-Cache-Hits": str(hits)}
+    return Response(content=content, media_type=f"image/{req.format}", headers=headers)
+
+
+# -- Deck sessions --
+class ReplaceSymbolOp(BaseModel):
+    op: Literal["replaceSymbol"]
+    symbol: SymbolDef  # replaces the symbol with the same id on every card that shows it
+
+
+class SetOptionsOp(BaseModel):
+    op: Literal["setOptions"]
+    # partial PageOpts / CardOpts / RandomOpts, merged into the current values
+    page: Optional[Dict[str, Any]] = None
+    card: Optional[Dict[str, Any]] = None
+    randomization: Optional[Dict[str, Any]] = None
+
+
+DeckOp = Annotated[Union[ReplaceSymbolOp, SetOptionsOp], Field(discriminator="op")]
+
+
+class DeckPatch(BaseModel):
+    ops: List[DeckOp] = Field(..., min_length=1)
+
+
+class DeckState(ApiResponse):
+    id: str
+    version: int
+    num_cards: int = Field(alias="numCards")
+    num_pages: int = Field(alias="numPages")
+    dirty_pages: List[int] = Field(alias="dirtyPages")  # pages the next PDF render has to redraw
+    changed_cards: Optional[List[int]] = Field(default=None, alias="changedCards")  # cards touched by a PATCH
+    pdf_url: str = Field(alias="pdfUrl")
+
+
+def _deck_state(session: DeckSession, changed_cards: Optional[List[int]] = None) -> DeckState:
+    return DeckState(
+        id=session.id,
+        version=session.version,
+        num_cards=len(session.cards),
+        num_pages=session.num_pages,
+        dirty_pages=session.dirty_pages(),
+        changed_cards=changed_cards,
+        pdf_url=f"{router.prefix}/decks/{session.id}/pdf",
+    )
+
+
+def _get_deck(deck_id: str) -> DeckSession:
+    session = deck_sessions.get(deck_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Unknown deck '{deck_id}'")
+    return session
+
+
+def _merge_opts(model, current: BaseModel, patch: Dict[str, Any], name: str):
+    """Overlay patch on current; patch keys may be field names or aliases, unknown keys are a 400."""
+    by_key = {key: field_name for field_name, info in model.model_fields.items()
+              for key in (field_name, info.alias) if key}
+    unknown = [key for key in patch if key not in by_key]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown {name} option '{unknown[0]}'")
+    try:
+        return model.model_validate({**current.model_dump(), **{by_key[k]: v for k, v in patch.items()}})
+    except ValidationError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} options: {exc.errors()[0]['msg']}")
+
+
+@router.post("/decks", status_code=201, response_model=DeckState,
+             responses={400: {"model": ExportError}, 503: {"model": ExportError}})
+def create_deck(req: ExportRequest):
+    resolved_cards, page, card, rnd = _resolve_export(req)
+    try:
+        session = deck_sessions.create([list(ids) for ids in req.cards], resolved_cards, page, card, rnd, source=req)
+    except TooManySessions:
+        raise HTTPException(status_code=503, detail="Too many open decks, retry later",
+                            headers={"Retry-After": "30"})
+    return _deck_state(session)
+
+
+@router.get("/decks/{deck_id}", response_model=DeckState, responses={404: {"model": ExportError}})
+def get_deck(deck_id: str):
+    return _deck_state(_get_deck(deck_id))
+
+
+@router.patch("/decks/{deck_id}", response_model=DeckState,
+              responses={400: {"model": ExportError}, 404: {"model": ExportError}})
+def patch_deck(deck_id: str, patch: DeckPatch):
+    session = _get_deck(deck_id)
+    with session.lock:
+        # validate and resolve every op first, so a bad op leaves the deck untouched
+        req: ExportRequest = session.source
+        known = {sym.id for sym in req.symbols}
+        actions = []
+        for op in patch.ops:
+            if isinstance(op, ReplaceSymbolOp):
+                if op.symbol.id not in known:
+                    raise HTTPException(status_code=400, detail=f"Unknown symbol '{op.symbol.id}'")
+                resolved = _build_symbol_lookup([op.symbol])[op.symbol.id]
+                req = req.model_copy(update={
+                    "symbols": [op.symbol if sym.id == op.symbol.id else sym for sym in req.symbols],
+                })
+                actions.append((op.symbol.id, resolved))
+            else:
+                update = {}
+                if op.page:
+                    update["page"] = _merge_opts(PageOpts, req.page, op.page, "page")
+                if op.card:
+                    update["card"] = _merge_opts(CardOpts, req.card, op.card, "card")
+                if op.randomization:
+                    update["randomization"] = _merge_opts(RandomOpts, req.randomization, op.randomization,
+                                                          "randomization")
+                req = req.model_copy(update=update)
+                actions.append((None, _export_specs(req)))
+
+        changed: set = set()
+        for symbol_id, value in actions:
+            if symbol_id is not None:
+                changed.update(session.replace_symbol(symbol_id, value))
+            elif session.set_specs(*value):
+                changed.update(range(len(session.cards)))
+        session.source = req
+        return _deck_state(session, changed_cards=sorted(changed))
+
+
+@router.get("/decks/{deck_id}/pdf", responses={404: {"model": ExportError}})
+def deck_pdf(deck_id: str):
+    session = _get_deck(deck_id)
+    with session.lock:
+        pdf_bytes, drawn = session.render()
+        headers = {
+            **_export_headers(session.cards, session.rconf),
+            "X-Deck-Version": str(session.version),
+            "X-Pages-Rendered": str(drawn),
+            "X-Pages-Reused": str(session.num_pages - drawn),
+        }
     return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+@router.delete("/decks/{deck_id}", status_code=204, responses={404: {"model": ExportError}})
+def delete_deck(deck_id: str):
+    if not deck_sessions.delete(deck_id):
+        raise HTTPException(status_code=404, detail=f"Unknown deck '{deck_id}'")
+    return Response(status_code=204)
+
+
+# -- Plane queries --
+# Cards and symbols are addressed by their index in the plane, as returned by /generate
+# (card i is cards[i]; symbol s is symbols[s])
+MATCH_BATCH_MAX_PAIRS = 100_000
+
+
+class PairMatch(ApiResponse):
+    card_a: int = Field(alias="cardA")
+    card_b: int = Field(alias="cardB")
+    symbol: int
+
+
+class SymbolCards(ApiResponse):
+    symbol: int
+    cards: List[int]
+
+
+class MatchBatchRequest(BaseModel):
+    pairs: List[Tuple[int, int]] = Field(..., max_length=MATCH_BATCH_MAX_PAIRS)
+
+
+class MatchBatchResponse(ApiResponse):
+    symbols: List[int]  # symbols[k] is shared by pairs[k]
+
+
+def _plane_index(n: int):
+    if n not in VALID_ORDERS:
+        raise HTTPException(status_code=400, detail=f"No projective plane of order {n} is supported")
+    return get_index(n)
+
+
+def _check_card(index, c: int) -> None:
+    if not 0 <= c < index.num_cards:
+        raise HTTPException(status_code=400, detail=f"Card {c} out of range 0..{index.num_cards - 1}")
+
+
+@router.get("/planes/{n}/match", response_model=PairMatch, responses={400: {"model": ExportError}})
+def match_pair(n: int, a: int = Query(...), b: int = Query(...)):
+    index = _plane_index(n)
+    _check_card(index, a)
+    _check_card(index, b)
+    if a == b:
+        raise HTTPException(status_code=400, detail="A card does not match itself")
+    return PairMatch(card_a=a, card_b=b, symbol=index.pair(a, b))
+
+
+@router.post("/planes/{n}/match", response_model=MatchBatchResponse, responses={400: {"model": ExportError}})
+def match_pairs(n: int, req: MatchBatchRequest):
+    index = _plane_index(n)
+    pairs = np.asarray(req.pairs, dtype=np.int64).reshape(-1, 2)
+    bad = np.flatnonzero(((pairs < 0) | (pairs >= index.num_cards)).any(axis=1) | (pairs[:, 0] == pairs[:, 1]))
+    if bad.size:
+        k = int(bad[0])
+        raise HTTPException(status_code=400, detail=f"Invalid pair {k}: {list(req.pairs[k])}")
+    return MatchBatchResponse(symbols=index.pairs(pairs[:, 0], pairs[:, 1]).tolist())
+
+
+@router.get("/planes/{n}/symbols/{s}/cards", response_model=SymbolCards, responses={400: {"model": ExportError}})
+def symbol_cards(n: int, s: int):
+    index = _plane_index(n)
+    if not 0 <= s < index.num_cards:
+        raise HTTPException(status_code=400, detail=f"Symbol {s} out of range 0..{index.num_cards - 1}")
+    return SymbolCards(symbol=s, cards=index.symbol_cards[s].tolist())
+
+
+# -- Game rooms --
+class GameCreate(BaseModel):
+    n: int = Field(default=7, ge=2)
+
+
+class GameRoomInfo(ApiResponse):
+    id: str
+    n: int
+    status: str
+    players: int
+    ws_url: str = Field(alias="wsUrl")
+
+
+def _room_info(room: Room) -> GameRoomInfo:
+    return GameRoomInfo(id=room.id, n=room.n, status=room.status, players=len(room.players),
+                        ws_url=f"{router.prefix}/games/{room.id}/ws")
+
+
+@router.post("/games", status_code=201, response_model=GameRoomInfo,
+             responses={400: {"model": ExportError}, 503: {"model": ExportError}})
+async def create_game(req: GameCreate):
+    # async so the room registry is only ever touched from the event loop; the index
+    # may wait on the shared store lock or a plane build, so it is fetched in a thread
+    if req.n not in VALID_ORDERS:
+        raise HTTPException(status_code=400, detail=f"No projective plane of order {req.n} is supported")
+    index = await run_in_threadpool(get_index, req.n)
+    try:
+        room = game_rooms.create(req.n, index)
+    except TooManyRooms:
+        raise HTTPException(status_code=503, detail="Too many game rooms, retry later", headers={"Retry-After": "30"})
+    return _room_info(room)
+
+
+@router.get("/games/{room_id}", response_model=GameRoomInfo, responses={404: {"model": ExportError}})
+def get_game(room_id: str):
+    room = game_rooms.get(room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail=f"Unknown game room '{room_id}'")
+    return _room_info(room)
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _parse_game_message(text: Optional[str]) -> Optional[Dict]:
+    """A client message as a dict, or None for binary frames, bad JSON and non-objects."""
+    if text is None:
+        return None
+    try:
+        msg = json.loads(text)
+    except ValueError:
+        return None
+    return msg if isinstance(msg, dict) else None
+
+
+# Sending to a client that has gone away raises WebSocketDisconnect, or RuntimeError once
+# the socket is closed, or the server's OSError-based ClientDisconnected
+_SEND_ERRORS = (WebSocketDisconnect, RuntimeError, OSError)
+
+
+@router.websocket("/games/{room_id}/ws")
+async def game_socket(ws: WebSocket, room_id: str, name: str = "player"):
+    """
+    Client messages: {"type": "start", "seed": 1?}, {"type": "claim", "symbol": 17, "seq": 5?}
+    and {"type": "state"}. The server answers claims with {"type": "claim", "ok": bool, "seq": ...}
+    and broadcasts {"type": "state", ...} to the room after every change.
+    """
+    await ws.accept()
+    room = game_rooms.get(room_id)
+    if room is None:
+        await ws.send_json({"type": "error", "detail": f"Unknown game room '{room_id}'"})
+        await ws.close(code=4404)
+        return
+
+    # broadcasts from other players' handlers may overlap with this handler's own replies
+    send_lock = asyncio.Lock()
+
+    async def send_text(text: str) -> None:
+        async with send_lock:
+            await ws.send_text(text)
+
+    async def send(message: Dict) -> None:
+        await send_text(json.dumps(message, separators=(",", ":")))
+
+    try:
+        player = game_rooms.join(room, name, send_text)
+    except GameError as exc:
+        await ws.send_json({"type": "error", "detail": str(exc)})
+        await ws.close(code=4409)
+        return
+
+    try:
+        await send({"type": "joined", "room": room.id, "player": player.id, "n": room.n})
+        await game_rooms.broadcast_state(room)
+        # a failed broadcast from another player's handler drops this player from the room
+        while player.id in room.players and ws.application_state == WebSocketState.CONNECTED:
+            frame = await ws.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            if player.id not in room.players:
+                break
+            msg = _parse_game_message(frame.get("text"))
+            if msg is None:
+                await send({"type": "error", "detail": "Messages must be JSON objects sent as text frames"})
+                continue
+            kind = msg.get("type")
+
+            if kind == "claim":
+                symbol = msg.get("symbol")
+                ok = _is_int(symbol) and room.claim(player.id, symbol)
+                await send({"type": "claim", "ok": ok, "seq": msg.get("seq")})
+                if ok:
+                    await game_rooms.broadcast_state(room)
+            elif kind == "start":
+                seed = msg.get("seed")
+                if seed is not None and not _is_int(seed):
+                    await send({"type": "error", "detail": "seed must be an integer"})
+                    continue
+                try:
+                    room.deal(seed)
+                except GameError as exc:
+                    await send({"type": "error", "detail": str(exc)})
+                    continue
+                await game_rooms.broadcast_state(room)
+            elif kind == "state":
+                await send(room.state())
+            else:
+                await send({"type": "error", "detail": f"Unknown message type '{kind}'"})
+    except _SEND_ERRORS:
+        pass
+    finally:
+        game_rooms.leave(room, player.id)
+        await game_rooms.broadcast_state(room)
@@ -0,0 +1,142 @@
+# services/deck_sessions.py
+import io
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .export_pdf import CardSpec, PageSpec, RandomSpec, create_pdf, splice_pages, write_pdf
+
+
+class TooManySessions(Exception):
+    pass
+
+
+# Splice re-rendered pages into the previous PDF only while few pages changed. Each splice
+# carries its own copies of the images it drew, so once the PDF has grown past
+# SPLICE_MAX_GROWTH times its last full render, the next render starts over.
+SPLICE_MAX_DIRTY_FRACTION = 0.5
+SPLICE_MAX_GROWTH = 2.0
+
+
+@dataclass
+class DeckSession:
+    """
+    A deck kept on the server between edits, together with its last rendered PDF.
+    Edits mark only the pages they touch as dirty; the next render draws just
+    those pages and splices them into the previous PDF.
+    """
+    id: str
+    card_ids: List[List[str]]  # symbol ids per card
+    cards: List[List[Dict]]  # resolved symbols per card
+    page: PageSpec
+    card: CardSpec
+    rconf: RandomSpec
+    source: Any = None  # request the deck was created from, kept current by the caller
+    version: int = 1
+    pdf: Optional[bytes] = None
+    dirty: Set[int] = field(default_factory=set)
+    full_size: int = 0  # bytes of the last full render
+    touched_at: float = field(default_factory=time.time)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def num_pages(self) -> int:
+        return math.ceil(len(self.cards) / self.card.per_page)
+
+    def dirty_pages(self) -> List[int]:
+        if self.pdf is None:
+            return list(range(self.num_pages))
+        return sorted(self.dirty)
+
+    def cards_with_symbol(self, symbol_id: str) -> List[int]:
+        return [ci for ci, ids in enumerate(self.card_ids) if symbol_id in ids]
+
+    def replace_symbol(self, symbol_id: str, resolved: Dict) -> List[int]:
+        """Swap one symbol on every card showing it (n + 1 cards); returns the changed cards."""
+        changed = self.cards_with_symbol(symbol_id)
+        for ci in changed:
+            self.cards[ci] = [resolved if sid == symbol_id else sym
+                              for sid, sym in zip(self.card_ids[ci], self.cards[ci])]
+        self.dirty.update(ci // self.card.per_page for ci in changed)
+        self.version += 1
+        return changed
+
+    def set_specs(self, page: PageSpec, card: CardSpec, rconf: RandomSpec) -> bool:
+        """Replace the page/card/randomization specs; any actual change makes every page dirty."""
+        if (page, card, rconf) == (self.page, self.card, self.rconf):
+            return False
+        self.page, self.card, self.rconf = page, card, rconf
+        self.pdf = None
+        self.dirty.clear()
+        self.version += 1
+        return True
+
+    def render(self) -> Tuple[bytes, int]:
+        """The deck PDF with every edit applied, and how many pages had to be drawn for it."""
+        dirty = self.dirty_pages()
+        full = (
+                self.pdf is None
+                or len(dirty) > self.num_pages * SPLICE_MAX_DIRTY_FRACTION
+                or len(self.pdf) > self.full_size * SPLICE_MAX_GROWTH
+        )
+        if full:
+            self.pdf = create_pdf(self.cards, self.page, self.card, self.rconf)
+            self.full_size = len(self.pdf)
+            drawn = self.num_pages
+        elif dirty:
+            buf = io.BytesIO()
+            write_pdf(buf, self.cards, self.page, self.card, self.rconf, pages=dirty)
+            self.pdf = splice_pages(self.pdf, buf.getvalue(), dirty)
+            drawn = len(dirty)
+        else:
+            drawn = 0
+        self.dirty.clear()
+        return self.pdf, drawn
+
+
+class DeckSessionStore:
+    """
+    In-memory deck sessions. Sessions idle for longer than ttl_s are dropped;
+    creating more than max_sessions live ones raises TooManySessions.
+    """
+
+    def __init__(self, max_sessions: int = 64, ttl_s: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._sessions: Dict[str, DeckSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self, card_ids: List[List[str]], cards: List[List[Dict]], page: PageSpec, card: CardSpec,
+               rconf: RandomSpec, source: Any = None) -> DeckSession:
+        self._expire()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise TooManySessions()
+            session = DeckSession(id=uuid.uuid4().hex, card_ids=card_ids, cards=cards,
+                                  page=page, card=card, rconf=rconf, source=source)
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[DeckSession]:
+        self._expire()
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            session.touched_at = time.time()
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        with self._lock:
+            for sid in [sid for sid, s in self._sessions.items() if s.touched_at < cutoff]:
+                del self._sessions[sid]
+
+
+deck_sessions = DeckSessionStore()
@@ -0,0 +1,68 @@
+# services/disk.py
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import IO, Callable, Iterator, List, Optional, Tuple
+
+_evict_lock = threading.Lock()
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "wb") -> Iterator[IO]:
+    """
+    Open a temp file next to path and move it over path once the block succeeds,
+    so readers never see a partial file. On failure the temp file is removed.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def scan_dir(directory: str, match: Callable[[str], object]) -> List[Tuple[float, int, str]]:
+    """(mtime, size, path) of the files in directory whose name matches; empty if it does not exist."""
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if match(entry.name):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def evict_dir(directory: str, max_bytes: int, match: Callable[[str], object],
+              keep: Optional[str] = None) -> List[str]:
+    """
+    Remove the least recently used matching files (oldest mtime first) until they
+    fit in max_bytes; keep is never removed. Callers mark files as used with
+    os.utime. Returns the removed paths.
+    """
+    removed = []
+    with _evict_lock:
+        entries = scan_dir(directory, match)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            removed.append(path)
+    return removed
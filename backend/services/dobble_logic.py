@@ -1,7 +1,121 @@
 # services/dobble_logic.py
-from typing import Optional, Dict
+import json
+import struct
+from functools import lru_cache
+from typing import Optional, Dict, List, Tuple, Iterable, Iterator, Hashable, Sequence
 
-VALID_ORDERS = [2, 3, 4, 5, 7]
+import numpy as np
+
+from .cache import LRUCache
+from .shared_store import shared_store
+
+# Largest plane order we build decks for (order 31 -> 993 cards, 32 symbols per card)
+MAX_ORDER = 31
+
+
+# -- Finite field GF(p^k) --
+def _prime_power(q: int) -> Optional[Tuple[int, int]]:
+    """Return (p, k) with q == p ** k for a prime p, or None if q is not a prime power."""
+    if q < 2:
+        return None
+    p = next(d for d in range(2, q + 1) if q % d == 0)
+    k = 0
+    while q % p == 0:
+        q //= p
+        k += 1
+    return (p, k) if q == 1 else None
+
+
+def _poly_mulmod(a: List[int], b: List[int], modulus: List[int], p: int) -> List[int]:
+    """Multiply two polynomials (coefficients low -> high) modulo a monic polynomial over GF(p)."""
+    k = len(modulus) - 1
+    prod = [0] * (2 * k - 1)
+    for i, ai in enumerate(a):
+        if ai:
+            for j, bj in enumerate(b):
+                prod[i + j] = (prod[i + j] + ai * bj) % p
+    # reduce from the top degree down; modulus is monic
+    for deg in range(len(prod) - 1, k - 1, -1):
+        coef = prod[deg]
+        if coef:
+            for t in range(k + 1):
+                prod[deg - k + t] = (prod[deg - k + t] - coef * modulus[t]) % p
+    return prod[:k]
+
+
+def _digits(x: int, p: int, k: int) -> List[int]:
+    return [(x // p ** i) % p for i in range(k)]
+
+
+def _irreducible_poly(p: int, k: int) -> List[int]:
+    """Find a monic irreducible polynomial of degree k over GF(p) (coefficients low -> high)."""
+    if k == 1:
+        return [0, 1]
+    for tail in range(p ** k):
+        cand = _digits(tail, p, k) + [1]
+        if cand[0] == 0:
+            continue
+        # irreducible iff no monic factor of degree 1..k//2 divides it
+        reducible = False
+        for d in range(1, k // 2 + 1):
+            for ftail in range(p ** d):
+                factor = _digits(ftail, p, d) + [1]
+                # polynomial long division remainder
+                rem = list(cand)
+                for deg in range(len(rem) - 1, d - 1, -1):
+                    coef = rem[deg]
+                    if coef:
+                        for t in range(d + 1):
+                            rem[deg - d + t] = (rem[deg - d + t] - coef * factor[t]) % p
+                if not any(rem[:d]):
+                    reducible = True
+                    break
+            if reducible:
+                break
+        if not reducible:
+            return cand
+    raise ValueError(f"No irreducible polynomial of degree {k} over GF({p})")
+
+
+@lru_cache(maxsize=None)
+def field_tables(q: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Addition and multiplication lookup tables of GF(q), each of shape (q, q).
+    Element x stands for the polynomial whose base-p digits are its coefficients,
+    so 0 and 1 are the additive and multiplicative identities, and for prime q the
+    tables reduce to plain arithmetic mod q.
+    """
+    pk = _prime_power(q)
+    if pk is None:
+        raise ValueError(f"GF({q}) does not exist: {q} is not a prime power")
+    p, k = pk
+
+    if k == 1:
+        r = np.arange(q)
+        add = (r[:, None] + r[None, :]) % q
+        mul = (r[:, None] * r[None, :]) % q
+    else:
+        # digit-wise addition mod p
+        weights = p ** np.arange(k)
+        dig = (np.arange(q)[:, None] // weights) % p  # (q, k)
+        add = (((dig[:, None, :] + dig[None, :, :]) % p) * weights).sum(axis=2)
+
+        modulus = _irreducible_poly(p, k)
+        mul = np.zeros((q, q), dtype=np.int64)
+        polys = [_digits(x, p, k) for x in range(q)]
+        for a in range(1, q):
+            for b in range(a, q):
+                prod = _poly_mulmod(polys[a], polys[b], modulus, p)
+                mul[a, b] = mul[b, a] = sum(c * p ** i for i, c in enumerate(prod))
+
+    add = add.astype(np.int64)
+    mul = mul.astype(np.int64)
+    add.flags.writeable = False
+    mul.flags.writeable = False
+    return add, mul
+
+
+VALID_ORDERS = [q for q in range(2, MAX_ORDER + 1) if _prime_power(q) is not None]
 
 
 def get_params(
@@ -43,31 +157,261 @@ def get_params(
     return None
 
 
-def generate_projective_plane(n: int):
+def generate_projective_plane(n: int) -> np.ndarray:
     """
-    Returns the cards (blocks) of a projective plane of order n.
+    Returns the cards (blocks) of a projective plane of order n as an int array
+    of shape (n^2 + n + 1, n + 1); row i lists the symbol indices on card i.
+    Works for every prime power n via GF(n) lookup tables.
     Ensures that 0 appears in the first (n+1) cards.
     """
-    cards = []
+    add, mul = field_tables(n)
+    dtype = np.int32
+    num_cards = n ** 2 + n + 1
+    cards = np.empty((num_cards, n + 1), dtype=dtype)
+
+    # Symbol layout: 0 is the vertical point at infinity, 1..n the slopes at infinity,
+    # and n+1 + n*x + y the affine point (x, y).
+    ks = np.arange(n)
 
-    # First card: 0..n
-    cards.append(list(range(n + 1)))
+    # First card: the line at infinity 0..n
+    cards[0] = np.arange(n + 1)
 
-    # Next n cards, all contain 0
+    # Next n cards, all contain 0: vertical lines x = j
+    cards[1:n + 1, 0] = 0
+    cards[1:n + 1, 1:] = n + 1 + n * ks[:, None] + ks[None, :]
+
+    # Remaining n*n cards: lines y = i*x + j, plus slope point i+1
+    # ys[i, j, k] = i*k + j evaluated in GF(n)
+    ys = add[mul[:, None, :], ks[None, :, None]]
+    cards[n + 1:, 0] = np.repeat(ks + 1, n)
+    cards[n + 1:, 1:] = (n + 1 + n * ks[None, None, :] + ys).reshape(n * n, n)
+
+    return cards
+
+
+def iter_projective_plane(n: int) -> Iterator[List[int]]:
+    """
+    Same cards in the same order as generate_projective_plane, built one at a time
+    so memory stays O(n) regardless of order.
+    """
+    add, mul = field_tables(n)
+    ks = np.arange(n)
+
+    # First card: the line at infinity 0..n
+    yield list(range(n + 1))
+
+    # Next n cards, all contain 0: vertical lines x = j
     for j in range(n):
-        card = [0]
-        for k in range(n):
-            value = n + 1 + n * j + k
-            card.append(value)
-        cards.append(card)
+        yield [0] + (n + 1 + n * j + ks).tolist()
 
-    # Remaining n*n cards
+    # Remaining n*n cards: lines y = i*x + j, plus slope point i+1
     for i in range(n):
         for j in range(n):
-            card = [i + 1]
-            for k in range(n):
-                value = n + 1 + n * k + ((i * k + j) % n)
-                card.append(value)
-            cards.append(card)
+            yield [i + 1] + (n + 1 + n * ks + add[mul[i], j]).tolist()
 
-    return cards
+
+# -- Deck cache --
+class DeckCache(LRUCache[np.ndarray]):
+    """
+    Process-wide LRU cache of generated planes keyed by order.
+    Entries are stored as compact, read-only index arrays and evicted least recently
+    used first once their combined size exceeds max_bytes. Planes are built once per
+    host and mapped from the shared store, so every worker reads the same pages.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        super().__init__(max_bytes, sizeof=lambda cards: cards.nbytes)
+
+    def plane(self, n: int) -> np.ndarray:
+        return self.get_or_create(n, lambda: shared_store.array(
+            f"plane-n{n}", lambda: _compact(generate_projective_plane(n))))
+
+    def warm(self, orders: Iterable[int]) -> None:
+        for n in orders:
+            if n in VALID_ORDERS:
+                self.plane(n)
+
+    def stats(self) -> Dict[str, object]:
+        return {**super().stats(), "orders": self.keys()}
+
+
+def _compact(cards: np.ndarray) -> np.ndarray:
+    """Smallest unsigned dtype that holds every symbol index, flagged read-only."""
+    dtype = np.uint16 if cards.max(initial=0) <= np.iinfo(np.uint16).max else np.uint32
+    out = np.ascontiguousarray(cards, dtype=dtype)
+    out.flags.writeable = False
+    return out
+
+
+deck_cache = DeckCache()
+
+
+def get_plane(n: int) -> np.ndarray:
+    """Cached generate_projective_plane; the returned array is shared and read-only."""
+    return deck_cache.plane(n)
+
+
+# -- Incidence index --
+class DeckIndex:
+    """
+    Lookup tables for one plane of order n with N = n^2 + n + 1 cards and symbols:
+      card_symbols[c]   symbols on card c (the plane itself)
+      symbol_cards[s]   cards showing symbol s (n + 1 of them, ascending)
+      match[a, b]       the one symbol cards a and b share, -1 on the diagonal
+    match is dense (N^2 int16, about 2 MB at n = 31), so single and batched pair
+    queries are plain array indexing.
+    """
+
+    def __init__(self, cards: np.ndarray, symbol_cards: Optional[np.ndarray] = None,
+                 match: Optional[np.ndarray] = None):
+        self.card_symbols = cards
+        self.symbol_cards = _symbol_cards(cards) if symbol_cards is None else symbol_cards
+        self.match = _match_table(self.symbol_cards) if match is None else match
+        for arr in (self.symbol_cards, self.match):
+            arr.flags.writeable = False
+
+    @property
+    def num_cards(self) -> int:
+        return self.card_symbols.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.symbol_cards.nbytes + self.match.nbytes
+
+    def pair(self, a: int, b: int) -> int:
+        return int(self.match[a, b])
+
+    def pairs(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return self.match[a, b]
+
+
+def _symbol_cards(cards: np.ndarray) -> np.ndarray:
+    num_cards, per_card = cards.shape
+    # stable sort of the flattened plane groups card numbers by symbol, cards ascending
+    order = np.argsort(cards.ravel(), kind="stable")
+    return (order // per_card).astype(np.int16).reshape(num_cards, per_card)
+
+
+def _match_table(symbol_cards: np.ndarray) -> np.ndarray:
+    num_cards = symbol_cards.shape[0]
+    # every pair of cards through symbol s meets in s
+    match = np.full((num_cards, num_cards), -1, dtype=np.int16)
+    rows = symbol_cards[:, :, None]
+    cols = symbol_cards[:, None, :]
+    match[rows, cols] = np.arange(num_cards, dtype=np.int16)[:, None, None]
+    np.fill_diagonal(match, -1)
+    return match
+
+
+index_cache: LRUCache[DeckIndex] = LRUCache(16 * 1024 * 1024, sizeof=lambda index: index.nbytes)
+
+
+def get_index(n: int) -> DeckIndex:
+    """Cached DeckIndex over the cached plane of order n; its tables come from the shared store."""
+
+    def _build() -> DeckIndex:
+        cards = get_plane(n)
+        symbol_cards = shared_store.array(f"index-symbols-n{n}", lambda: _symbol_cards(cards))
+        match = shared_store.array(f"index-match-n{n}", lambda: _match_table(symbol_cards))
+        return DeckIndex(cards, symbol_cards, match)
+
+    return index_cache.get_or_create(n, _build)
+
+
+# -- Deck validation --
+# Symbol columns per slice of the incidence matrix, so a slice (2048 cards) stays around 16 MiB
+CHECK_DECK_CHUNK_SYMBOLS = 2048
+
+
+def check_deck(cards: Sequence[Sequence[Hashable]], max_pairs: int = 100) -> Dict[str, object]:
+    """
+    Check the Dobble property of an arbitrary deck: every pair of cards shares exactly
+    one symbol and no card repeats a symbol. Works on the (card, symbol) pairs: sorting
+    them finds repeated symbols, and symbols on fewer than two cards, which cannot be
+    shared, are dropped before anything dense is built. The card x card intersection
+    sizes are then summed as M @ M.T over slices of the card x symbol incidence matrix
+    M, so memory stays bounded by the card count rather than cards x symbols.
+    Returns the number of offending pairs and the first max_pairs of them (row-major),
+    each with the symbols the two cards actually share.
+    """
+    num_cards = len(cards)
+    lengths = np.fromiter((len(c) for c in cards), dtype=np.int64, count=num_cards)
+    ids: Dict[Hashable, int] = {}
+    cols = np.fromiter((ids.setdefault(s, len(ids)) for c in cards for s in c), dtype=np.int64,
+                       count=int(lengths.sum()))
+    rows = np.repeat(np.arange(num_cards), lengths)
+
+    # Sorted (row, col) pairs: a repeat of the previous pair is a card showing a symbol twice
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+    repeat = (rows[1:] == rows[:-1]) & (cols[1:] == cols[:-1])
+    duplicate_cards = np.unique(rows[1:][repeat])
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = ~repeat
+    rows, cols = rows[keep], cols[keep]
+
+    # Only symbols on at least two cards, renumbered 0..k-1
+    on_cards = np.bincount(cols, minlength=len(ids))
+    remap = np.full(len(ids), -1, dtype=np.int64)
+    common = np.flatnonzero(on_cards > 1)
+    remap[common] = np.arange(len(common))
+    cols = remap[cols]
+    rows, cols = rows[cols >= 0], cols[cols >= 0]
+
+    by_symbol = np.argsort(cols, kind="stable")
+    rows, cols = rows[by_symbol], cols[by_symbol]
+    shared = np.zeros((num_cards, num_cards), dtype=np.float32)  # exact for counts below 2^24
+    for lo in range(0, len(common), CHECK_DECK_CHUNK_SYMBOLS):
+        hi = min(lo + CHECK_DECK_CHUNK_SYMBOLS, len(common))
+        a, b = np.searchsorted(cols, [lo, hi])
+        incidence = np.zeros((num_cards, hi - lo), dtype=np.float32)
+        incidence[rows[a:b], cols[a:b] - lo] = 1.0
+        shared += incidence @ incidence.T
+
+    bad = shared != 1
+    np.fill_diagonal(bad, False)
+    card_a, card_b = np.nonzero(np.triu(bad))
+    pairs = []
+    for a, b in zip(card_a[:max_pairs].tolist(), card_b[:max_pairs].tolist()):
+        both = set(cards[a]).intersection(cards[b])
+        pairs.append({"card_a": a, "card_b": b, "shared": len(both),
+                      "symbols": sorted(both, key=str)})
+    return {
+        "valid": not len(card_a) and not len(duplicate_cards),
+        "num_cards": num_cards,
+        "num_symbols": len(ids),
+        "bad_pairs": len(card_a),
+        "pairs": pairs,
+        "duplicate_cards": duplicate_cards.tolist(),
+    }
+
+
+# -- Packed wire format --
+PACKED_DECK_MEDIA_TYPE = "application/vnd.dobble.deck"
+_PACKED_MAGIC = b"DBL1"
+
+
+def pack_deck(cards: np.ndarray, symbols: List[str]) -> bytes:
+    """
+    Binary deck, all little-endian:
+      4s magic "DBL1" | u16 num_cards | u16 symbols_per_card | u32 symbols_json_len
+      | num_cards * symbols_per_card u16 symbol indices (row per card)
+      | symbols as a UTF-8 JSON array
+    The index block starts at byte 12, so it can be viewed as a Uint16Array directly.
+    """
+    num_cards, per_card = cards.shape
+    sym_json = json.dumps(symbols, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    header = _PACKED_MAGIC + struct.pack("<HHI", num_cards, per_card, len(sym_json))
+    return header + np.ascontiguousarray(cards, dtype="<u2").tobytes() + sym_json
+
+
+def unpack_deck(data: bytes) -> Tuple[np.ndarray, List[str]]:
+    """Inverse of pack_deck. Raises ValueError on a bad magic or a header that overruns the data."""
+    if len(data) < 12 or data[:4] != _PACKED_MAGIC:
+        raise ValueError("Not a packed deck")
+    num_cards, per_card, sym_len = struct.unpack_from("<HHI", data, 4)
+    end = 12 + 2 * num_cards * per_card
+    if len(data) != end + sym_len:
+        raise ValueError(f"Packed deck header describes {end + sym_len} bytes, got {len(data)}")
+    cards = np.frombuffer(data, dtype="<u2", count=num_cards * per_card, offset=12).reshape(num_cards, per_card)
+    return cards, json.loads(data[end:end + sym_len].decode("utf-8"))
@@ -0,0 +1,118 @@
+# services/export_jobs.py
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import BinaryIO, Callable, Dict, Optional
+
+# render(out, progress) writes the PDF to out and calls progress(cards_drawn) along the way
+RenderFn = Callable[[BinaryIO, Callable[[int], None]], None]
+
+EXPORT_JOB_DIR = os.getenv("EXPORT_JOB_DIR", os.path.join(tempfile.gettempdir(), "dobble-jobs"))
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class ExportJob:
+    id: str
+    total: int
+    drawn: int = 0
+    status: str = "queued"  # "queued" | "running" | "done" | "failed"
+    error: Optional[str] = None
+    result_path: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+
+class ExportJobQueue:
+    """
+    Background PDF renders on a bounded thread pool. At most max_workers jobs run
+    at once and at most max_queued wait behind them; further submits raise
+    QueueFull. Finished jobs and their files are dropped after result_ttl_s: by a
+    timer started when the job finishes, and on every submit and lookup.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 16, result_ttl_s: float = 3600.0):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.result_ttl_s = result_ttl_s
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, render: RenderFn, total: int, headers: Optional[Dict[str, str]] = None) -> ExportJob:
+        self._expire()
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+            if pending >= self.max_workers + self.max_queued:
+                raise QueueFull()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export-job")
+            job = ExportJob(id=uuid.uuid4().hex, total=total, headers=dict(headers or {}))
+            self._jobs[job.id] = job
+            self._executor.submit(self._run, job, render)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: ExportJob, render: RenderFn) -> None:
+        job.status = "running"
+
+        def progress(drawn: int) -> None:
+            job.drawn = drawn
+
+        path = None
+        try:
+            os.makedirs(EXPORT_JOB_DIR, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=EXPORT_JOB_DIR, suffix=".pdf")
+            with os.fdopen(fd, "wb") as out:
+                render(out, progress)
+            job.result_path = path
+            job.drawn = job.total
+            job.status = "done"
+        except Exception as exc:
+            job.error = str(exc) or exc.__class__.__name__
+            job.status = "failed"
+            if path is not None:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        finally:
+            job.finished_at = time.time()
+            # clean up even if no further requests arrive
+            timer = threading.Timer(self.result_ttl_s + 1.0, self._expire)
+            timer.daemon = True
+            timer.start()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.result_ttl_s
+        with self._lock:
+            expired = [j for j in self._jobs.values() if j.finished_at is not None and j.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.result_path:
+                try:
+                    os.remove(job.result_path)
+                except OSError:
+                    pass
+
+
+export_jobs = ExportJobQueue()
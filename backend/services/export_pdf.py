@@ -1,19 +1,28 @@
 import io
 import math
+import multiprocessing
+import os
 import random
-import re
-import base64
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass, field
 from os import scandir
-from typing import Dict, List, Optional, Tuple, Union, Literal
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union, Literal
 
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from pypdf import PdfReader, PdfWriter
+
+from .fonts import font_registry, symbol_font
+from .layout_templates import Layout, get_templates, template_key
+from .metrics import (DRAW_CARD_SECONDS, EXPORT_STAGE_SECONDS, LAYOUT_CARD_SECONDS, LAYOUT_FALLBACKS, LAYOUT_FIT,
+                      LAYOUT_RETRIES, registry)
+from .symbol_images import prepare_image
 
 
 # -- Model --
@@ -31,6 +40,7 @@ class CardSpec:
     bleed_mm: float
     per_page: int
     cut_marks: bool
+    image_dpi: Optional[int] = 300  # resample images to this DPI at their largest size; None keeps originals
 
 
 @dataclass
@@ -48,13 +58,14 @@ class RandomSpec:
     scale: RangeSpec = field(default_factory=lambda: RangeSpec(1.0, 1.0))
     angular_jitter_deg: float = 0.0
     radial_jitter_mm: float = 0.0
-    ring_strategy: str = "single"
+    ring_strategy: str = "single"  # "single" | "multi"
+    layout_pool: int = 0  # > 0: reuse this many precomputed layouts across cards (needs a seed)
+    # per-card budget of the "multi" search: candidate layouts tried, and wall time (0: no time limit)
+    layout_iterations: int = 16
+    layout_budget_ms: float = 0.0
 
 
 # -- Utilities --
-_DATA_URL_RE = re.compile(r"^data:(?P<mime>[^;]+);base64,(?P<b64>.+)$")
-
-
 def _mm(val: float) -> float:
     return val * mm
 
@@ -74,24 +85,6 @@ def _page_size_mm(spec: PageSpec) -> Tuple[float, float]:
     return w, h
 
 
-def _decode_data_url(url: str) -> ImageReader:
-    match = _DATA_URL_RE.match(url)
-    if not match:
-        raise ValueError(f"Invalid data URL: {url}")
-    base = base64.b64decode(match.group("b64"))
-    return ImageReader(io.BytesIO(base))
-
-
-def _ensure_font(name: str, path: Optional[str] = None):
-    # You can register extra fonts here if needed
-    if name not in pdfmetrics.getRegisteredFontNames():
-        if path:
-            pdfmetrics.registerFont(TTFont(name, path))
-        else:
-            # Will fallback to built-ins (Helvetica, Times, Courier)
-            pass
-
-
 # placement helpers
 def _rand_between(rng: random.Random, lo: float, hi: float) -> float:
     return rng.uniform(lo, hi)
@@ -101,6 +94,65 @@ def _deg2rad(deg: float) -> float:
     return deg * math.pi / 180
 
 
+# -- Collision index --
+LAYOUT_ATTEMPTS = 20
+# Gap kept between a symbol and the card edge
+EDGE_MARGIN_MM = 0.2
+
+
+class _PlacementIndex:
+    """
+    Disks placed so far on a card, in placement order. Slots go around the ring in
+    order, so the most recently placed disks are the nearest neighbours of a new
+    candidate; checking them first finds a collision after one or two tests
+    instead of scanning the whole card.
+    """
+
+    def __init__(self, margin_mm: float):
+        self.margin = margin_mm
+        self.placed: List[Tuple[float, float, float]] = []  # (x_mm, y_mm, eff_radius_mm)
+
+    def add(self, x: float, y: float, r: float) -> None:
+        self.placed.append((x, y, r))
+
+    def collides(self, x: float, y: float, r: float) -> bool:
+        for (px, py, pr) in reversed(self.placed):
+            if math.hypot(x - px, y - py) < (r + pr + self.margin):
+                return True
+        return False
+
+
+def _ring_xy(angle_deg: float, rr: float, max_rr: float) -> Tuple[float, float]:
+    rr = max(0.0, min(rr, max_rr))
+    theta = math.radians(angle_deg)
+    return rr * math.cos(theta), rr * math.sin(theta)
+
+
+# -- Symbol sizes --
+def _size_categories(rconf: RandomSpec) -> List[Tuple[float, Tuple[float, float]]]:
+    """(probability, scale multiplier range) of the small, medium and large symbol sizes."""
+    mix = getattr(rconf, "mix", (0.60, 0.30, 0.10))
+    muls = (getattr(rconf, "mul_small", (0.80, 0.95)),
+            getattr(rconf, "mul_medium", (0.95, 1.10)),
+            getattr(rconf, "mul_large", (1.15, 1.50)))
+    return list(zip(mix, muls))
+
+
+def _symbol_scale(rnd: random.Random, rconf: RandomSpec,
+                  categories: List[Tuple[float, Tuple[float, float]]]) -> float:
+    """Base scale times the multiplier of a random size category (three draws from rnd)."""
+    base_sc = _rand_between(rnd, float(rconf.scale.min), float(rconf.scale.max))
+    r = rnd.random()
+    lo, hi = categories[-1][1]
+    cumulative = 0.0
+    for p, mul in categories[:-1]:
+        cumulative += p
+        if r < cumulative:
+            lo, hi = mul
+            break
+    return base_sc * _rand_between(rnd, float(lo), float(hi))
+
+
 # layout: return list of (x_mm, y_mm, angle_deg, scale) for each symbol slot
 def layout_card(
         n_slots: int,
@@ -108,60 +160,64 @@ def layout_card(
         rnd: random.Random,
         rconf: RandomSpec,
 ) -> List[Tuple[float, float, float, float]]:
+    """
+    Place the symbols of one card with rconf.ring_strategy: "single" (one ring,
+    see _layout_single_ring) or "multi" (concentric rings, see _layout_multi_ring).
+    Returns (x_mm, y_mm, rot_deg, scale) for each symbol, relative to the card center.
+    """
+    t0 = time.perf_counter()
+    strategy = "multi" if getattr(rconf, "ring_strategy", "single") == "multi" else "single"
+    if strategy == "multi":
+        positions, retries, fallbacks = _layout_multi_ring(n_slots, card_radius_mm, rnd, rconf)
+    else:
+        positions, retries, fallbacks = _layout_single_ring(n_slots, card_radius_mm, rnd, rconf)
+    if retries:
+        LAYOUT_RETRIES.inc(retries, strategy=strategy)
+    if fallbacks:
+        LAYOUT_FALLBACKS.inc(fallbacks, strategy=strategy)
+    LAYOUT_CARD_SECONDS.observe(time.perf_counter() - t0, strategy=strategy)
+    return positions
+
+
+def _layout_single_ring(
+        n_slots: int,
+        card_radius_mm: float,
+        rnd: random.Random,
+        rconf: RandomSpec,
+) -> Tuple[List[Tuple[float, float, float, float]], int, int]:
     """
     Place symbols on a single ring with collision avoidance and a bias that allows
-    larger symbols to sit closer to the center. Returns (x_mm, y_mm, rot_deg, scale)
-    for each symbol, relative to the card center.
+    larger symbols to sit closer to the center. Returns the positions, the retries
+    and the number of symbols placed by the shrink-and-clamp fallback.
     """
     base_angle = 360.0 / n_slots
     positions: List[Tuple[float, float, float, float]] = []
+    retries = fallbacks = 0
 
     # Base ring radius (fraction of card radius)
     ring_radius_ratio = float(getattr(rconf, "ring_radius_ratio", 0.75))
     ring_r = max(0.0, card_radius_mm * ring_radius_ratio)
 
-    # Size categories and multipliers
-    mix = getattr(rconf, "mix", (0.60, 0.30, 0.10))  # (small, medium, large)
-    mul_small = getattr(rconf, "mul_small", (0.80, 0.95))
-    mul_medium = getattr(rconf, "mul_medium", (0.95, 1.10))
-    mul_large = getattr(rconf, "mul_large", (1.15, 1.50))
-
-    def _choose_size_category(rng: random.Random) -> str:
-        r = rng.random()
-        a, b, _ = mix
-        if r < a:
-            return "small"
-        if r < a + b:
-            return "medium"
-        return "large"
-
-    def _mul_range(cat: str) -> Tuple[float, float]:
-        return {"small": mul_small, "medium": mul_medium, "large": mul_large}[cat]
-
-    # Jitter & ranges
+    # Size categories, jitter & ranges
+    categories = _size_categories(rconf)
     ang_jit = float(getattr(rconf, "angular_jitter_deg", 0.0))
     rad_jit = float(getattr(rconf, "radial_jitter_mm", 0.0))
     rot_min = float(getattr(getattr(rconf, "rotation_deg", None), "min", 0.0))
     rot_max = float(getattr(getattr(rconf, "rotation_deg", None), "max", 0.0))
-    base_scale_min = float(rconf.scale.min)
-    base_scale_max = float(rconf.scale.max)
 
     # Collision model: approximate symbols by disks derived from their square box
     # symbol_box_frac matches the base draw size (fraction of diameter)
     symbol_box_frac = float(getattr(rconf, "symbol_box_frac", 0.20))
     overlap_margin_mm = float(getattr(rconf, "overlap_margin_mm", 1.0))
 
-    placed: List[Tuple[float, float, float]] = []  # (x_mm, y_mm, eff_radius_mm)
+    placed = _PlacementIndex(overlap_margin_mm)
 
     for i in range(n_slots):
         # 1) Base angle with jitter
         angle = base_angle * i + _rand_between(rnd, -ang_jit, ang_jit)
 
         # 2) Scale: base scale times category multiplier
-        base_sc = _rand_between(rnd, base_scale_min, base_scale_max)
-        cat = _choose_size_category(rnd)
-        lo, hi = _mul_range(cat)
-        sc = base_sc * _rand_between(rnd, float(lo), float(hi))
+        sc = _symbol_scale(rnd, rconf, categories)
 
         # 3) Rotation
         rot = _rand_between(rnd, rot_min, rot_max)
@@ -173,33 +229,25 @@ def layout_card(
 
         # 5) Baseline radius suggestion and bounds
         rr_base = max(0.0, ring_r + _rand_between(rnd, -rad_jit, rad_jit))
-        max_rr = max(0.0, card_radius_mm - eff_r - 0.2)
+        max_rr = max(0.0, card_radius_mm - eff_r - EDGE_MARGIN_MM)
 
         # 6) Try to place without collisions; bias attempts inward
         best_xy: Optional[Tuple[float, float]] = None
-        for attempt in range(20):
+        for attempt in range(LAYOUT_ATTEMPTS):
             # small angular wiggle on retries
             ang = angle + (0.0 if attempt == 0 else _rand_between(rnd, -6.0, 6.0))
-            theta = math.radians(ang)
             # progressively move inward on retries to help large symbols fit near center
-            rr = rr_base - (attempt * 0.4)
-            rr = max(0.0, min(rr, max_rr))
-
-            x = rr * math.cos(theta)
-            y = rr * math.sin(theta)
-
-            # Collision check against previously placed symbols
-            ok = True
-            for (px, py, peff) in placed:
-                if math.hypot(x - px, y - py) < (eff_r + peff + overlap_margin_mm):
-                    ok = False
-                    break
-            if ok:
+            x, y = _ring_xy(ang, rr_base - (attempt * 0.4), max_rr)
+
+            # Collision check against previously placed symbols, nearest first
+            if not placed.collides(x, y, eff_r):
                 best_xy = (x, y)
                 break
+            retries += 1
 
         # 7) Fallback if no collision-free spot found: slightly shrink and clamp radius
         if best_xy is None:
+            fallbacks += 1
             sc *= 0.9
             side_mm = (2.0 * card_radius_mm) * symbol_box_frac * sc
             eff_r = side_mm / math.sqrt(2.0)
@@ -209,9 +257,159 @@ def layout_card(
 
         x, y = best_xy
         positions.append((x, y, rot, sc))
-        placed.append((x, y, eff_r))
+        placed.add(x, y, eff_r)
 
-    return positions
+    # a collision on the last attempt leads to the fallback, not another retry
+    return positions, retries - fallbacks, fallbacks
+
+
+# -- Multi-ring packing --
+# The fit search stops once it knows the largest fitting scale to within this much
+LAYOUT_FIT_TOLERANCE = 0.01
+
+
+def _ring_arc(r: float, ring_r: float, margin_mm: float) -> float:
+    """Half the angle a symbol of radius r claims on a ring of radius ring_r."""
+    return math.asin((r + margin_mm / 2) / ring_r)
+
+
+def _pack_rings(radii: List[float], card_radius_mm: float,
+                margin_mm: float) -> Optional[List[Tuple[float, List[int]]]]:
+    """
+    Pack symbols of the given radii (ascending) on concentric rings, filling each
+    ring from the edge inwards with as many of the smallest remaining symbols as
+    fit; a single last symbol takes the center. Returns (ring radius, indices) per
+    ring, or None if they do not all fit. Rings sit one symbol width plus margin
+    apart and each symbol claims an arc wide enough that its neighbours cannot
+    touch it, so a packing never overlaps.
+    """
+    rings: List[Tuple[float, List[int]]] = []
+    limit = card_radius_mm - EDGE_MARGIN_MM  # outer edge allowed for the next ring's symbols
+    start, n = 0, len(radii)
+
+    def fits(count: int) -> bool:
+        r_max = radii[start + count - 1]
+        ring_r = limit - r_max
+        if ring_r < r_max + margin_mm / 2:
+            return False
+        return sum(_ring_arc(r, ring_r, margin_mm) for r in radii[start:start + count]) <= math.pi
+
+    while start < n:
+        if n - start == 1 and radii[start] <= limit:
+            rings.append((0.0, [start]))
+            break
+        # adding a symbol never makes the rest fit better, so bisect the ring's count
+        lo, hi = 0, n - start
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        if lo < 2:
+            return None
+        r_max = radii[start + lo - 1]
+        rings.append((limit - r_max, list(range(start, start + lo))))
+        limit -= 2 * r_max + margin_mm
+        start += lo
+    return rings
+
+
+def _layout_multi_ring(
+        n_slots: int,
+        card_radius_mm: float,
+        rnd: random.Random,
+        rconf: RandomSpec,
+) -> Tuple[List[Tuple[float, float, float, float]], int, int]:
+    """
+    Place symbols on concentric rings (_pack_rings), smallest symbols outermost.
+    When the drawn sizes do not fit, every symbol is scaled by the largest factor
+    that does, found by bisection. The search is anytime: each candidate narrows
+    the bracket and the best fitting one so far is kept, so it stops when the fit
+    is known to LAYOUT_FIT_TOLERANCE, or when rconf.layout_iterations candidates or
+    rconf.layout_budget_ms are used up (once something fits). Placements never
+    overlap, so the shrink-and-clamp fallback is only needed when not even
+    tiny symbols fit, and then the single ring places the card. Returns the
+    positions, the candidates tried after the first and the fallbacks.
+    """
+    t0 = time.perf_counter()
+    budget_ms = float(getattr(rconf, "layout_budget_ms", 0.0))
+    deadline = t0 + budget_ms / 1000 if budget_ms > 0 else None
+    max_iterations = int(getattr(rconf, "layout_iterations", 16))
+
+    categories = _size_categories(rconf)
+    ang_jit = math.radians(float(getattr(rconf, "angular_jitter_deg", 0.0)))
+    rot_min = float(getattr(getattr(rconf, "rotation_deg", None), "min", 0.0))
+    rot_max = float(getattr(getattr(rconf, "rotation_deg", None), "max", 0.0))
+    symbol_box_frac = float(getattr(rconf, "symbol_box_frac", 0.20))
+    margin_mm = float(getattr(rconf, "overlap_margin_mm", 1.0))
+
+    # Drawn size and rotation per symbol, in card order
+    scales: List[float] = []
+    rots: List[float] = []
+    for _ in range(n_slots):
+        scales.append(_symbol_scale(rnd, rconf, categories))
+        rots.append(_rand_between(rnd, rot_min, rot_max))
+
+    # Effective radius per symbol (disk that contains the square draw box), smallest first
+    order = sorted(range(n_slots), key=lambda i: scales[i])
+    radii = [(2.0 * card_radius_mm) * symbol_box_frac * scales[i] / math.sqrt(2.0) for i in order]
+
+    # Anytime search for the largest fit in (lo, hi]: full size first, then bisection
+    best: Optional[List[Tuple[float, List[int]]]] = None
+    lo, hi, fit = 0.0, 1.0, 1.0
+    iterations = 0
+    while True:
+        iterations += 1
+        rings = _pack_rings([r * fit for r in radii], card_radius_mm, margin_mm)
+        if rings is not None:
+            best, lo = rings, fit
+        else:
+            hi = fit
+            if best is None and hi < LAYOUT_FIT_TOLERANCE:
+                # not even tiny symbols fit (a huge symbol count or margin): use the single ring
+                positions, retries, fallbacks = _layout_single_ring(n_slots, card_radius_mm, rnd, rconf)
+                return positions, retries + iterations, fallbacks
+        if best is not None and (hi - lo <= LAYOUT_FIT_TOLERANCE or iterations >= max_iterations
+                                 or (deadline is not None and time.perf_counter() >= deadline)):
+            break
+        fit = (lo + hi) / 2
+    LAYOUT_FIT.observe(lo)
+
+    positions: List[Tuple[float, float, float, float]] = [(0.0, 0.0, 0.0, 1.0)] * n_slots
+    for ring_r, members in best:
+        if ring_r == 0.0:
+            i = order[members[0]]
+            positions[i] = (0.0, 0.0, rots[i], scales[i] * lo)
+            continue
+        rnd.shuffle(members)
+        arcs = [_ring_arc(radii[k] * lo, ring_r, margin_mm) for k in members]
+        # spare angle is shared evenly; jitter stays within half of it so neighbours keep clear
+        gap = (2 * math.pi - 2 * sum(arcs)) / len(members)
+        jitter = min(ang_jit, gap / 2)
+        theta = _rand_between(rnd, 0.0, 2 * math.pi)
+        for j, (k, arc) in enumerate(zip(members, arcs)):
+            if j:
+                theta += arcs[j - 1] + gap + arc
+            i = order[k]
+            t = theta + _rand_between(rnd, -jitter, jitter)
+            positions[i] = (ring_r * math.cos(t), ring_r * math.sin(t), rots[i], scales[i] * lo)
+    return positions, iterations - 1, 0
+
+
+def layout_pool(n_slots: int, diameter_mm: float, rconf: RandomSpec) -> Optional[List[Layout]]:
+    """
+    Precomputed layouts shared by every card with this geometry, or None when cards
+    are laid out individually. Template k is layout_card seeded with seed + k, so
+    template 0 is the layout a fixed seed gives without a pool.
+    """
+    if not rconf.layout_pool or not rconf.seed:
+        return None
+    key = template_key(n_slots, diameter_mm, rconf)
+    return get_templates(key, lambda: [
+        layout_card(n_slots, diameter_mm / 2, random.Random(rconf.seed + k), rconf)
+        for k in range(rconf.layout_pool)
+    ])
 
 
 # draw one circular card at (cx, cy) center; diameter in mm
@@ -222,17 +420,21 @@ def draw_card(
         diameter_mm: float,
         stroke_mm: float,
         rconf: RandomSpec,
-        font_fallback: str = "Helvetica-Bold"
+        font_fallback: str = "Helvetica-Bold",
+        image_forms: Optional[Dict[int, str]] = None,
+        positions: Optional[List[Tuple[float, float, float, float]]] = None,
 ):
     radius_mm = diameter_mm / 2
     p = canvas.beginPath()
     p.circle(cx, cy, _mm(radius_mm))
     canvas.saveState()
     canvas.clipPath(p, stroke=0, fill=0)
+    canvas.setFillGray(0)  # text color; restored with the clip state
 
-    # layout position
-    rnd = random.Random(rconf.seed or random.randrange(1 << 30))
-    positions = layout_card(len(card), radius_mm, rnd, rconf)
+    # layout position (unless a precomputed template was passed in)
+    if positions is None:
+        rnd = random.Random(rconf.seed or random.randrange(1 << 30))
+        positions = layout_card(len(card), radius_mm, rnd, rconf)
 
     # draw card
     for sys, pos in zip(card, positions):
@@ -246,6 +448,14 @@ def draw_card(
             # Square bounding box around symbol center
             bbox = _mm(diameter_mm * 0.20) * scale
 
+            form = image_forms.get(id(img)) if image_forms else None
+            if form:
+                # shared XObject drawn in a unit box; scale it up to the symbol box
+                canvas.scale(bbox, bbox)
+                canvas.doForm(form)
+                canvas.restoreState()
+                continue
+
             # Draw in a box, but keep the aspect ratio and center
             canvas.drawImage(
                 img,
@@ -257,12 +467,11 @@ def draw_card(
             )
         else:
             txt = str(sys["text"])
-            # honor 'font_family' if present
-            font = str(sys.get("font_family") or font_fallback)
+            # resolved font name if present, else 'font_family'
+            font = symbol_font(sys, font_fallback)
             size_pt = _mm(diameter_mm * 0.16) * scale
             canvas.setFont(font, size_pt)
-            canvas.setFillGray(0)
-            w = canvas.stringWidth(txt, font, size_pt)
+            w = font_registry.text_width(txt, font, size_pt)
             canvas.drawString(-w / 2, -w / 2.8, txt)
 
         canvas.restoreState()
@@ -274,6 +483,48 @@ def draw_card(
         canvas.circle(cx, cy, _mm(radius_mm))
 
 
+@dataclass
+class ImageStats:
+    placed: int = 0  # image symbols drawn across all cards
+    embedded: int = 0  # distinct images stored in the PDF
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.placed / self.embedded if self.embedded else 1.0
+
+
+def image_stats(cards: List[List[Dict]]) -> ImageStats:
+    """Count image placements vs. distinct images; each distinct image is embedded once."""
+    stats = ImageStats()
+    seen = set()
+    for symbols in cards:
+        for sym in symbols:
+            if sym["type"] == "image":
+                stats.placed += 1
+                seen.add(id(sym["image"]))
+    stats.embedded = len(seen)
+    return stats
+
+
+def _register_image_forms(c: canvas.Canvas, cards: List[List[Dict]]) -> Dict[int, str]:
+    """
+    Emit every distinct image once as a named form XObject spanning the unit box
+    centered on the origin; draw_card references it with doForm on each card.
+    """
+    forms: Dict[int, str] = {}
+    for symbols in cards:
+        for sym in symbols:
+            if sym["type"] != "image" or id(sym["image"]) in forms:
+                continue
+            name = f"sym{len(forms)}"
+            c.beginForm(name, lowerx=-0.5, lowery=-0.5, upperx=0.5, uppery=0.5)
+            c.drawImage(sym["image"], -0.5, -0.5, width=1, height=1,
+                        mask='auto', preserveAspectRatio=True, anchor='c')
+            c.endForm()
+            forms[id(sym["image"])] = name
+    return forms
+
+
 def paginate_cards(
         canvas: canvas.Canvas,
         page_w: float, page_h: float,
@@ -318,37 +569,116 @@ def paginate_cards(
     return centers
 
 
+def _prepare_images(cards: List[List[Dict]], card: CardSpec, rconf: RandomSpec) -> List[List[Dict]]:
+    """
+    Swap every image symbol for a copy resampled to card.image_dpi at the largest
+    size layout_card can give it (base box * max scale * large-size multiplier).
+    """
+    mul_large = getattr(rconf, "mul_large", (1.15, 1.50))
+    box_mm = card.diameter_mm * 0.20 * float(rconf.scale.max) * float(mul_large[1])
+
+    # symbol dicts are shared between cards, so resample each one once
+    prepared: Dict[int, Dict] = {}
+    out: List[List[Dict]] = []
+    for symbols in cards:
+        row = []
+        for sym in symbols:
+            if sym["type"] == "image":
+                key = id(sym)
+                if key not in prepared:
+                    prepared[key] = {**sym, "image": prepare_image(sym["image"], box_mm, card.image_dpi)}
+                sym = prepared[key]
+            row.append(sym)
+        out.append(row)
+    return out
+
+
 def create_pdf(
         cards: List[List[Dict]],
         page: PageSpec,
         card: CardSpec,
         rconf: RandomSpec,
-        fonts: Optional[Dict[str, str]] = None  # { "Inter": "/path/Inter-Bold.ttf" }
+        fonts: Optional[Dict[str, str]] = None,  # { "Inter": "/path/Inter-Bold.ttf" }
+        workers: int = 1,
+        card_offset: int = 0,
 ) -> bytes:
-    # register fonts
-    if fonts:
-        for fname, fpath in fonts.items():
-            _ensure_font(fname, fpath)
-    w, h = _page_size_mm(page)
     buf = io.BytesIO()
-    # set the page size correctly
-    c = canvas.Canvas(buf, pagesize=(w, h))
+    write_pdf(buf, cards, page, card, rconf, fonts, workers, card_offset)
+    return buf.getvalue()
+
 
+def write_pdf(
+        out: BinaryIO,
+        cards: List[List[Dict]],
+        page: PageSpec,
+        card: CardSpec,
+        rconf: RandomSpec,
+        fonts: Optional[Dict[str, str]] = None,
+        workers: int = 1,
+        card_offset: int = 0,
+        progress: Optional[Callable[[int], None]] = None,
+        pages: Optional[List[int]] = None,
+) -> None:
+    """
+    Render the deck as PDF into a writable binary file object.
+    With workers > 1 the pages are split into chunks rendered in worker processes
+    and merged back in order (see _write_pdf_parallel). card_offset is the deck
+    index of cards[0], so chunks pick the same layout templates as a full render.
+    progress, if given, is called with the number of cards drawn so far.
+    pages, if given, renders only those page indices of the deck, in that order.
+    """
     # Enforce a hard limit: at most 6 cards per page
     if card.per_page > 6:
         raise ValueError("card.per_page must be <= 6")
     if card.per_page < 1:
         raise ValueError("card.per_page must be >= 1")
 
+    if card.image_dpi:
+        with EXPORT_STAGE_SECONDS.time(stage="image_resample"):
+            cards = _prepare_images(cards, card, rconf)
+
+    if fonts is None:
+        fonts = _deck_fonts(cards)
+
+    num_pages = math.ceil(len(cards) / card.per_page)
+    if workers > 1 and num_pages > 1 and pages is None:
+        _write_pdf_parallel(out, cards, page, card, rconf, fonts, workers, progress)
+        return
+
+    # register fonts (worker processes may not have loaded the registry)
+    for fname, fpath in fonts.items():
+        font_registry.ensure(fname, fpath)
+    w, h = _page_size_mm(page)
+    # set the page size correctly
+    c = canvas.Canvas(out, pagesize=(w, h))
+
     centers = paginate_cards(c, w, h, page.margin_mm, card.diameter_mm, card.per_page)
+    per_page = len(centers)
+    if pages is None:
+        pages = list(range(math.ceil(len(cards) / per_page)))
+
+    # embed each distinct image once (of the cards on the pages drawn); cards reference it by name
+    with EXPORT_STAGE_SECONDS.time(stage="image_embed"):
+        image_forms = _register_image_forms(c, [cards[i] for p in pages
+                                                for i in range(p * per_page, min((p + 1) * per_page, len(cards)))])
+    # template pools by slot count; card i takes template i % pool size
+    pools: Dict[int, Optional[List[Layout]]] = {}
+
     # draw cards, paginating to fit page size
-    idx = 0
-    while idx < len(cards):
-        for cx, cy in centers:
+    drawn = 0
+    for p in pages:
+        for slot, (cx, cy) in enumerate(centers):
+            idx = p * per_page + slot
             if idx >= len(cards):
                 break
 
+            n_slots = len(cards[idx])
+            if n_slots not in pools:
+                pools[n_slots] = layout_pool(n_slots, card.diameter_mm, rconf)
+            pool = pools[n_slots]
+
             # draw card
+            t0 = time.perf_counter()
             draw_card(
                 canvas=c,
                 cx=cx,
@@ -357,7 +687,10 @@ def create_pdf(
                 diameter_mm=card.diameter_mm,
                 stroke_mm=card.stroke_mm,
                 rconf=rconf,
+                image_forms=image_forms,
+                positions=pool[(card_offset + idx) % len(pool)] if pool else None,
             )
+            DRAW_CARD_SECONDS.observe(time.perf_counter() - t0)
 
             # cut marks optional
             if card.cut_marks:
@@ -368,9 +701,172 @@ def create_pdf(
                     ox = math.cos(th) * (r + _mm(3))
                     oy = math.sin(th) * (r + _mm(3))
                     c.line(cx + ox - 6, cy + oy, cx + ox + 6, cy + oy)
-            # advance to next card after drawing each one
-            idx += 1
+            drawn += 1
+            if progress:
+                progress(drawn)
         c.showPage()
 
     c.save()
+
+
+def _deck_fonts(cards: List[List[Dict]]) -> Dict[str, str]:
+    """The registry's TrueType files for the fonts the deck uses (standard fonts need none)."""
+    return font_registry.font_files({symbol_font(sym) for symbols in cards for sym in symbols
+                                     if sym["type"] != "image"})
+
+
+# -- Parallel rendering --
+# Upper bound for the shared worker pool; requests may ask for fewer
+MAX_RENDER_WORKERS = os.cpu_count() or 1
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_lock = threading.Lock()
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """
+    Workers must not be forked from the server itself: it runs threads, and a child
+    can inherit a lock (image cache, metrics, ...) that another thread was holding.
+    A forkserver forks from a clean single-threaded process that has this module
+    preloaded; spawn is the fallback where forkserver is unavailable.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=MAX_RENDER_WORKERS, mp_context=_pool_context())
+        return _render_pool
+
+
+def _create_pdf_in_worker(*args, **kwargs) -> Tuple[bytes, Dict]:
+    """create_pdf for the worker pool, returning the metrics it recorded along with the PDF."""
+    registry.drain()  # drop what an earlier, failed render left behind
+    data = create_pdf(*args, **kwargs)
+    return data, registry.drain()
+
+
+def _submit_render(*args, **kwargs) -> "Future[bytes]":
+    """
+    Run create_pdf in the shared worker pool. The returned future resolves to the PDF
+    bytes once the worker's metrics are merged into this process's registry;
+    cancelling it cancels the render if it has not started yet.
+    """
+    inner = _get_render_pool().submit(_create_pdf_in_worker, *args, **kwargs)
+    outer: Future = Future()
+    outer.add_done_callback(lambda f: f.cancelled() and inner.cancel())
+
+    def done(f: Future) -> None:
+        if f.cancelled():
+            outer.cancel()
+        elif outer.set_running_or_notify_cancel():
+            if f.exception() is not None:
+                outer.set_exception(f.exception())
+                return
+            data, drained = f.result()
+            registry.merge(drained)
+            outer.set_result(data)
+
+    inner.add_done_callback(done)
+    return outer
+
+
+def _write_pdf_parallel(
+        out: BinaryIO,
+        cards: List[List[Dict]],
+        page: PageSpec,
+        card: CardSpec,
+        rconf: RandomSpec,
+        fonts: Optional[Dict[str, str]],
+        workers: int,
+        progress: Optional[Callable[[int], None]] = None,
+) -> None:
+    """
+    Split the deck into page-aligned chunks, render each chunk with create_pdf in a
+    worker process and append the chunk PDFs in order. Every card seeds its own
+    layout RNG, so a fixed seed gives the same page content as the serial path.
+    """
+    workers = min(workers, MAX_RENDER_WORKERS)
+    num_pages = math.ceil(len(cards) / card.per_page)
+    pages_per_chunk = math.ceil(num_pages / workers)
+    step = pages_per_chunk * card.per_page
+    futures = [
+        _submit_render(cards[i:i + step], page, card, rconf, fonts, card_offset=i)
+        for i in range(0, len(cards), step)
+    ]
+
+    writer = PdfWriter()
+    for i, fut in enumerate(futures):
+        writer.append(PdfReader(io.BytesIO(fut.result())))
+        if progress:
+            progress(min((i + 1) * step, len(cards)))
+    # every chunk embeds its own copy of the images it uses; keep one of each
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    writer.write(out)
+
+
+def submit_pdf(cards: List[List[Dict]], page: PageSpec, card: CardSpec, rconf: RandomSpec) -> "Future[bytes]":
+    """
+    Render a whole deck with create_pdf in the shared worker pool. Drawing holds
+    the GIL, so decks rendered side by side need processes, not threads.
+    """
+    return _submit_render(cards, page, card, rconf, _deck_fonts(cards))
+
+
+def splice_pages(base: bytes, patch: bytes, pages: List[int]) -> bytes:
+    """
+    Return base with the given page indices replaced by the pages of patch, in
+    order (patch page k replaces base page pages[k]). Pages not listed are copied
+    over unchanged, so only the patch had to be rendered.
+    """
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(base)))
+    patch_pages = PdfReader(io.BytesIO(patch)).pages
+    for new_page, index in zip(patch_pages, pages):
+        writer.insert_page(new_page, index)
+        writer.remove_page(index + 1)
+    buf = io.BytesIO()
+    writer.write(buf)
     return buf.getvalue()
+
+
+# -- Streaming --
+# PDFs up to this size stay in memory; larger ones spill to a temp file on disk
+PDF_SPOOL_MAX_BYTES = 1024 * 1024
+PDF_CHUNK_BYTES = 64 * 1024
+
+
+def spool_pdf(
+        cards: List[List[Dict]],
+        page: PageSpec,
+        card: CardSpec,
+        rconf: RandomSpec,
+        fonts: Optional[Dict[str, str]] = None,
+        workers: int = 1,
+) -> BinaryIO:
+    """Render into a spooled temp file and return it rewound to the start."""
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+    try:
+        write_pdf(spool, cards, page, card, rconf, fonts, workers)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def iter_chunks(f: BinaryIO, chunk_size: int = PDF_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield the file in fixed-size chunks and close it once exhausted."""
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
@@ -0,0 +1,154 @@
+# services/fonts.py
+import logging
+import os
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+
+logger = logging.getLogger("dobble.fonts")
+
+# TrueType files (*.ttf) in this directory are registered at startup under their family and weight
+FONT_DIR = os.getenv("FONT_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fonts"))
+DEFAULT_FONT = "Helvetica-Bold"
+
+# Text widths kept per (text, font); one entry per distinct symbol text is typical
+WIDTH_CACHE_MAX_ENTRIES = 65536
+# fontFamily/fontWeight resolutions kept; clients choose the weights, so this is bounded too
+RESOLVE_CACHE_MAX_ENTRIES = 1024
+
+# Standard PDF fonts by family and CSS weight; every viewer has them, nothing is embedded
+_BUILTIN_FAMILIES: Dict[str, Dict[int, str]] = {
+    "helvetica": {400: "Helvetica", 700: "Helvetica-Bold"},
+    "times": {400: "Times-Roman", 700: "Times-Bold"},
+    "times-roman": {400: "Times-Roman", 700: "Times-Bold"},
+    "courier": {400: "Courier", 700: "Courier-Bold"},
+}
+
+
+class UnknownFont(ValueError):
+    pass
+
+
+def _weight_class(font: TTFont) -> int:
+    """usWeightClass from the OS/2 table (400 regular, 700 bold); 400 if the table is missing."""
+    try:
+        return struct.unpack(">H", font.face.get_table("OS/2")[4:6])[0]
+    except (KeyError, struct.error):
+        return 400
+
+
+def _is_italic(font: TTFont) -> bool:
+    style = font.face.styleName.decode("latin-1", "replace").lower()
+    return bool(font.face.italicAngle) or "italic" in style or "oblique" in style
+
+
+def symbol_font(sym: Dict, fallback: str = DEFAULT_FONT) -> str:
+    """ReportLab font name of a resolved text symbol."""
+    return str(sym.get("font") or sym.get("font_family") or fallback)
+
+
+class FontRegistry:
+    """
+    Maps the fontFamily/fontWeight of text symbols to ReportLab font names. The
+    standard PDF fonts are always available. TrueType files are registered with
+    ReportLab once and embedded in PDFs as subsets of the glyphs actually used.
+    Resolutions and text widths are memoized, so drawing a text symbol needs no
+    font lookups after its first use.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, Dict[int, str]] = {k: dict(v) for k, v in _BUILTIN_FAMILIES.items()}
+        self._names = set(pdfmetrics.standardFonts)
+        self._files: Dict[str, str] = {}  # registered TrueType name -> path
+        self._resolved: Dict[Tuple[Optional[str], Optional[int]], str] = {}
+        self._widths: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def load(self, directory: Optional[str] = FONT_DIR) -> int:
+        """Register every *.ttf under directory; returns how many were registered."""
+        if not directory or not os.path.isdir(directory):
+            return 0
+        count = 0
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            if entry.is_file() and entry.name.lower().endswith(".ttf"):
+                try:
+                    self.register_file(entry.path)
+                    count += 1
+                except TTFError as exc:  # e.g. CFF outlines, which ReportLab cannot embed
+                    logger.warning("skipping font %s: %s", entry.path, exc)
+        return count
+
+    def register_file(self, path: str, name: Optional[str] = None) -> str:
+        """Register a TrueType file under name (default: its file name without extension)."""
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        font = TTFont(name, path)
+        pdfmetrics.registerFont(font)
+        family = font.face.familyName.decode("latin-1", "replace").lower()
+        with self._lock:
+            self._names.add(name)
+            self._files[name] = path
+            # fontWeight picks among upright faces; italics stay reachable by their full name
+            if not _is_italic(font):
+                self._families.setdefault(family, {}).setdefault(_weight_class(font), name)
+            self._resolved.clear()
+        return name
+
+    def ensure(self, name: str, path: Optional[str] = None) -> None:
+        """Make name usable, registering the file at path unless a font of that name is known already."""
+        if name not in self._names and path:
+            self.register_file(path, name)
+
+    def resolve(self, family: Optional[str], weight: Optional[int] = None) -> str:
+        """
+        Font name for a fontFamily/fontWeight pair. A full font name such as
+        "Helvetica" or "Helvetica-Bold" is used as is, whatever the weight; any other
+        family picks its face closest to weight (ties go to the bolder one).
+        Raises UnknownFont otherwise.
+        """
+        key = (family, weight)
+        name = self._resolved.get(key)
+        if name is None:
+            name = self._resolve(family, weight)
+            with self._lock:
+                if len(self._resolved) >= RESOLVE_CACHE_MAX_ENTRIES:
+                    self._resolved.clear()
+                self._resolved[key] = name
+        return name
+
+    def _resolve(self, family: Optional[str], weight: Optional[int]) -> str:
+        if not family:
+            return DEFAULT_FONT
+        # exact names first, so "Times-Roman" is not swapped for the bold face of the times-roman family
+        if family in self._names:
+            return family
+        faces = self._families.get(family.lower())
+        if faces:
+            target = 400 if weight is None else weight
+            return faces[min(faces, key=lambda w: (abs(w - target), -w))]
+        raise UnknownFont(family)
+
+    def text_width(self, text: str, font: str, size: float) -> float:
+        """pdfmetrics.stringWidth, memoized per (text, font); widths scale linearly with size."""
+        key = (text, font)
+        unit = self._widths.get(key)
+        if unit is None:
+            if len(self._widths) >= WIDTH_CACHE_MAX_ENTRIES:
+                self._widths.clear()
+            unit = self._widths[key] = pdfmetrics.stringWidth(text, font, 1.0)
+        return unit * size
+
+    def font_files(self, names: Iterable[str]) -> Dict[str, str]:
+        """TrueType files behind the given font names (standard fonts have none)."""
+        return {name: self._files[name] for name in names if name in self._files}
+
+    def faces(self) -> List[Tuple[str, int, str]]:
+        """(family, weight, font name) for every face fontFamily/fontWeight can select."""
+        with self._lock:
+            return [(family, weight, name) for family, faces in sorted(self._families.items())
+                    for weight, name in sorted(faces.items())]
+
+
+font_registry = FontRegistry()
@@ -0,0 +1,167 @@
+# services/game.py
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .dobble_logic import DeckIndex, get_index
+
+# send(text) delivers one JSON-encoded message to a player's connection
+SendFn = Callable[[str], Awaitable[None]]
+
+
+class GameError(Exception):
+    pass
+
+
+class TooManyRooms(GameError):
+    pass
+
+
+@dataclass
+class Player:
+    id: str
+    name: str
+    send: SendFn
+    card: Optional[int] = None  # top card of the player's pile
+    score: int = 0  # cards won
+
+
+@dataclass
+class Room:
+    """
+    One game of "The Tower": every player starts with one face-up card and the
+    rest of the deck is the draw pile, topped by the center card. The first player
+    to name the symbol their card shares with the center card wins the center card,
+    which becomes their new top card. The game ends when the pile runs out.
+    """
+    id: str
+    n: int
+    index: DeckIndex
+    players: Dict[str, Player] = field(default_factory=dict)
+    pile: List[int] = field(default_factory=list)
+    center: Optional[int] = None
+    status: str = "waiting"  # "waiting" | "playing" | "finished"
+    created_at: float = field(default_factory=time.time)
+
+    def symbols(self, card: Optional[int]) -> Optional[List[int]]:
+        return None if card is None else self.index.card_symbols[card].tolist()
+
+    def state(self) -> Dict:
+        return {
+            "type": "state",
+            "room": self.id,
+            "status": self.status,
+            "center": {"card": self.center, "symbols": self.symbols(self.center)},
+            "remaining": len(self.pile),
+            "players": [
+                {"id": p.id, "name": p.name, "card": p.card, "symbols": self.symbols(p.card), "score": p.score}
+                for p in self.players.values()
+            ],
+        }
+
+    def deal(self, seed: Optional[int] = None) -> None:
+        if self.status == "playing":
+            raise GameError("Game already running")
+        if not self.players:
+            raise GameError("No players in the room")
+        if len(self.players) >= self.index.num_cards:
+            raise GameError("Not enough cards for every player plus a center card")
+        deck = list(range(self.index.num_cards))
+        random.Random(seed).shuffle(deck)
+        for player in self.players.values():
+            player.card = deck.pop()
+            player.score = 0
+        self.center = deck.pop()
+        self.pile = deck
+        self.status = "playing"
+
+    def claim(self, player_id: str, symbol: int) -> bool:
+        """
+        Validate a claimed match in O(1) against the shared-symbol table. A claim
+        against a center card that has already been won simply fails.
+        """
+        player = self.players.get(player_id)
+        if player is None or self.status != "playing" or player.card is None:
+            return False
+        if self.index.pair(player.card, self.center) != symbol:
+            return False
+        player.card = self.center
+        player.score += 1
+        if self.pile:
+            self.center = self.pile.pop()
+        else:
+            self.center = None
+            self.status = "finished"
+        return True
+
+    async def broadcast(self, message: Dict) -> List[str]:
+        """Send message to every player; returns the ids of players whose send failed."""
+        text = json.dumps(message, separators=(",", ":"))  # encode once for every player
+        players = list(self.players.values())
+        # one slow or broken connection must not hold up the others
+        results = await asyncio.gather(*(p.send(text) for p in players), return_exceptions=True)
+        return [p.id for p, result in zip(players, results) if isinstance(result, BaseException)]
+
+
+class GameRooms:
+    """
+    In-memory rooms for this process. A room is dropped once its last player
+    leaves, or after empty_ttl_s if nobody ever joins it.
+    """
+
+    def __init__(self, max_rooms: int = 1000, max_players: int = 8, empty_ttl_s: float = 600.0):
+        self.max_rooms = max_rooms
+        self.max_players = max_players
+        self.empty_ttl_s = empty_ttl_s
+        self._rooms: Dict[str, Room] = {}
+
+    def create(self, n: int, index: Optional[DeckIndex] = None) -> Room:
+        """index lets async callers build the plane off the event loop first."""
+        self._expire()
+        if len(self._rooms) >= self.max_rooms:
+            raise TooManyRooms()
+        room = Room(id=uuid.uuid4().hex[:12], n=n, index=index if index is not None else get_index(n))
+        self._rooms[room.id] = room
+        return room
+
+    def get(self, room_id: str) -> Optional[Room]:
+        return self._rooms.get(room_id)
+
+    def join(self, room: Room, name: str, send: SendFn) -> Player:
+        if len(room.players) >= self.max_players:
+            raise GameError("Room is full")
+        player = Player(id=uuid.uuid4().hex[:8], name=name[:32] or "player", send=send)
+        room.players[player.id] = player
+        return player
+
+    def leave(self, room: Room, player_id: str) -> None:
+        room.players.pop(player_id, None)
+        if not room.players:
+            self._rooms.pop(room.id, None)
+
+    async def broadcast_state(self, room: Room) -> None:
+        """
+        Send the room state to every player. Players whose connection failed are
+        dropped and the others get the state again, now without them.
+        """
+        while room.players:
+            dead = await room.broadcast(room.state())
+            if not dead:
+                return
+            for player_id in dead:
+                self.leave(room, player_id)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.empty_ttl_s
+        for room_id in [r.id for r in self._rooms.values() if not r.players and r.created_at < cutoff]:
+            del self._rooms[room_id]
+
+
+game_rooms = GameRooms()
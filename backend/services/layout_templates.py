@@ -0,0 +1,73 @@
+# services/layout_templates.py
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import asdict
+from typing import Callable, List, Optional, Tuple
+
+from .cache import LRUCache
+from .disk import atomic_write, evict_dir
+
+# One layout = (x_mm, y_mm, rot_deg, scale) per symbol slot
+Layout = List[Tuple[float, float, float, float]]
+
+# Template pools are persisted here so restarts and other workers can reuse them. Pools are
+# keyed by seed, so the directory is bounded: least recently used files go past the budget
+LAYOUT_TEMPLATE_DIR = os.getenv("LAYOUT_TEMPLATE_DIR", os.path.join(tempfile.gettempdir(), "dobble-layouts"))
+LAYOUT_TEMPLATE_DIR_MAX_BYTES = 64 * 1024 * 1024
+LAYOUT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Bump when layout_card changes what it places, so pools from older code are neither found nor read
+LAYOUT_TEMPLATE_VERSION = 2
+
+
+def _pool_bytes(pool: List[Layout]) -> int:
+    # rough: four floats per slot
+    return sum(len(layout) for layout in pool) * 4 * 8
+
+
+layout_cache: LRUCache[List[Layout]] = LRUCache(LAYOUT_CACHE_MAX_BYTES, sizeof=_pool_bytes)
+
+
+def template_key(n_slots: int, diameter_mm: float, rconf) -> str:
+    """Stable key for a pool: format version, slot count, card diameter and every RandomSpec field."""
+    spec = {"version": LAYOUT_TEMPLATE_VERSION, "slots": n_slots, "diameter_mm": diameter_mm,
+            "random": asdict(rconf)}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_templates(key: str, build: Callable[[], List[Layout]]) -> List[Layout]:
+    """Return the pool for key from memory, then disk, and only build it on a full miss."""
+    return layout_cache.get_or_create(key, lambda: _load_or_build(key, build))
+
+
+def _load(path: str) -> Optional[List[Layout]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        os.utime(path)  # mark as recently used
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != LAYOUT_TEMPLATE_VERSION:
+        return None
+    return [[tuple(pos) for pos in layout] for layout in data["pool"]]
+
+
+def _load_or_build(key: str, build: Callable[[], List[Layout]]) -> List[Layout]:
+    path = os.path.join(LAYOUT_TEMPLATE_DIR, f"{key}.json")
+    pool = _load(path)
+    if pool is not None:
+        return pool
+
+    pool = build()
+    try:
+        with atomic_write(path, "w") as f:
+            json.dump({"version": LAYOUT_TEMPLATE_VERSION, "pool": pool}, f)
+        evict_dir(LAYOUT_TEMPLATE_DIR, LAYOUT_TEMPLATE_DIR_MAX_BYTES, match=lambda name: name.endswith(".json"),
+                  keep=path)
+    except OSError:
+        # persistence is best effort; the in-memory pool still serves this process
+        pass
+    return pool
+
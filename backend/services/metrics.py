@@ -0,0 +1,251 @@
+# services/metrics.py
+import bisect
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("dobble.export")
+
+# Latency buckets in seconds, from single cards up to large decks
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for every label set."""
+
+    @abstractmethod
+    def drain(self) -> Dict[LabelValues, object]:
+        """Values recorded since the last drain, resetting them to zero."""
+
+    @abstractmethod
+    def merge(self, values: Dict[LabelValues, object]) -> None:
+        """Add values drained from the same metric in another process."""
+
+    def render(self) -> str:
+        head = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(head + self.samples())
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0.0  # unlabelled series are exposed from the start
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def drain(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            values = {key: v for key, v in self._values.items() if v}
+            self._values = {key: 0.0 for key in self._values}
+        return values
+
+    def merge(self, values: Dict[LabelValues, float]) -> None:
+        with self._lock:
+            for key, v in values.items():
+                self._values[key] = self._values.get(key, 0.0) + v
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (last = +Inf)], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        if not self.labelnames:
+            self._values[()] = ([0] * (len(self.buckets) + 1), [0.0])
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def drain(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        with self._lock:
+            values = {key: (counts, total[0]) for key, (counts, total) in self._values.items() if any(counts)}
+            self._values = {key: ([0] * (len(self.buckets) + 1), [0.0]) for key in self._values}
+        return values
+
+    def merge(self, values: Dict[LabelValues, Tuple[List[int], float]]) -> None:
+        with self._lock:
+            for key, (counts, total) in values.items():
+                mine, my_total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+                for i, n in enumerate(counts):
+                    mine[i] += n
+                my_total[0] += total
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+    def drain(self) -> Dict[str, Dict[LabelValues, object]]:
+        """
+        Everything recorded since the last drain, by metric name, and reset it. Worker
+        processes send this back with their results so the parent can merge it.
+        """
+        return {m.name: values for m in self._metrics for values in (m.drain(),) if values}
+
+    def merge(self, drained: Dict[str, Dict[LabelValues, object]]) -> None:
+        for m in self._metrics:
+            if m.name in drained:
+                m.merge(drained[m.name])
+
+
+registry = Registry()
+
+# -- Export pipeline --
+EXPORT_STAGE_SECONDS = registry.register(Histogram(
+    "dobble_export_stage_seconds", "Time spent per export stage.", ["stage"]))
+EXPORT_REQUEST_BYTES = registry.register(Counter(
+    "dobble_export_request_bytes_total", "Request body bytes received by export endpoints."))
+EXPORT_RESPONSE_BYTES = registry.register(Counter(
+    "dobble_export_response_bytes_total", "PDF bytes sent by export endpoints."))
+EXPORTS = registry.register(Counter(
+    "dobble_exports_total", "Export requests by outcome.", ["result"]))
+DRAW_CARD_SECONDS = registry.register(Histogram(
+    "dobble_draw_card_seconds", "Time to draw one card, layout included."))
+LAYOUT_CARD_SECONDS = registry.register(Histogram(
+    "dobble_layout_card_seconds", "Time to lay out the symbols of one card.", ["strategy"]))
+LAYOUT_RETRIES = registry.register(Counter(
+    "dobble_layout_retries_total",
+    "Layout attempts beyond the first: collision retries (single ring) or fit search steps (multi).", ["strategy"]))
+LAYOUT_FALLBACKS = registry.register(Counter(
+    "dobble_layout_fallbacks_total", "Symbols shrunk because no attempt placed them without a collision.",
+    ["strategy"]))
+LAYOUT_FIT = registry.register(Histogram(
+    "dobble_layout_fit", "Scale the multi-ring layout gives a card's symbols so that all of them fit.",
+    buckets=(0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)))
+
+# -- Previews --
+PREVIEW_STAGE_SECONDS = registry.register(Histogram(
+    "dobble_preview_stage_seconds", "Time spent per preview stage.", ["stage"]))
+
+# -- Images --
+IMAGE_DECODES = registry.register(Counter(
+    "dobble_image_decodes_total", "Symbol images decoded from their encoded bytes."))
+IMAGE_DECODE_BYTES = registry.register(Counter(
+    "dobble_image_decode_bytes_total", "Encoded image bytes decoded."))
+IMAGE_RESAMPLES = registry.register(Counter(
+    "dobble_image_resamples_total", "Symbol images resampled to the target DPI."))
+
+# Exports slower than this are logged with their stage breakdown; 0 disables the log
+SLOW_EXPORT_LOG_MS = 0.0
+
+
+class StageTimer:
+    """
+    Times the stages of one export. Each stage feeds dobble_export_stage_seconds
+    (or the given histogram); the per-request breakdown is kept for the slow-request log.
+    """
+
+    def __init__(self, started: Optional[float] = None, histogram: Optional[Histogram] = None):
+        self.started = time.perf_counter() if started is None else started
+        self.histogram = histogram or EXPORT_STAGE_SECONDS
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.histogram.observe(seconds, stage=name)
+
+    def finish(self, what: str) -> float:
+        """Total elapsed seconds; logs the breakdown if it exceeds SLOW_EXPORT_LOG_MS."""
+        elapsed = time.perf_counter() - self.started
+        if SLOW_EXPORT_LOG_MS and elapsed * 1000 >= SLOW_EXPORT_LOG_MS:
+            breakdown = " ".join(f"{name}={sec * 1000:.1f}ms" for name, sec in self.stages.items())
+            logger.warning("slow %s: %.1fms (%s)", what, elapsed * 1000, breakdown)
+        return elapsed
@@ -0,0 +1,190 @@
+# services/preview.py
+import io
+import math
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+from reportlab.pdfbase._fontdata import findT1File
+
+from .cache import LRUCache
+from .export_pdf import CardSpec, RandomSpec, layout_card, layout_pool
+from .fonts import font_registry, symbol_font
+from .symbol_images import image_key, prepare_image
+
+# Cards are drawn at this multiple of the requested size and scaled down, which antialiases edges
+SUPERSAMPLE = 2
+# Gap between cards on a contact sheet, in pixels
+SHEET_GAP_PX = 8
+# Encoder settings tuned for latency over size; thumbnails are small either way
+PNG_COMPRESS_LEVEL = 3
+WEBP_QUALITY = 80
+
+# Budget for rendered thumbnails (RGBA pixels) kept across requests
+PREVIEW_CACHE_MAX_BYTES = 32 * 1024 * 1024
+PREVIEW_WORKERS = min(4, os.cpu_count() or 1)
+
+preview_cache: LRUCache[Image.Image] = LRUCache(PREVIEW_CACHE_MAX_BYTES,
+                                                sizeof=lambda im: im.width * im.height * 4)
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # PIL releases the GIL while resizing, rotating and compositing
+            _pool = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix="preview")
+        return _pool
+
+
+def card_layout(index: int, n_slots: int, diameter_mm: float,
+                rconf: RandomSpec) -> List[Tuple[float, float, float, float]]:
+    """The placement write_pdf gives deck card index: its pool template, or layout_card with the seed."""
+    pool = layout_pool(n_slots, diameter_mm, rconf)
+    if pool:
+        return pool[index % len(pool)]
+    return layout_card(n_slots, diameter_mm / 2, random.Random(rconf.seed or random.randrange(1 << 30)), rconf)
+
+
+def _font(name: str, size_px: int) -> ImageFont.FreeTypeFont:
+    # FreeType faces must not be shared between threads, so every pool thread loads its own
+    return _thread_font(name, size_px, threading.get_ident())
+
+
+@lru_cache(maxsize=1024)
+def _thread_font(name: str, size_px: int, thread: int) -> ImageFont.FreeTypeFont:
+    """PIL font for a ReportLab font name: the standard Type 1 faces and registered TTFs, else PIL's default."""
+    try:
+        path = font_registry.font_files([name]).get(name) or findT1File(name)
+        return ImageFont.truetype(path, size_px)
+    except (KeyError, OSError, TypeError, AttributeError):
+        return ImageFont.load_default(size_px)
+
+
+def _symbol_key(sym: Dict) -> Hashable:
+    if sym["type"] == "image":
+        return "image", image_key(sym["image"])
+    return "text", str(sym["text"]), symbol_font(sym)
+
+
+def _symbol_tile(sym: Dict, box_px: float, font_fallback: str) -> Image.Image:
+    """The symbol drawn upright on a transparent square tile centered on its anchor, just roomy enough to rotate."""
+    if sym["type"] == "image":
+        side = int(math.ceil(box_px * math.sqrt(2))) + 2
+        tile = Image.new("RGBA", (side, side), (0, 0, 0, 0))
+        mid = side / 2
+        src = sym["image"]._image.convert("RGBA")
+        # fit the box keeping the aspect ratio, like drawImage(preserveAspectRatio=True, anchor='c')
+        fit = box_px / max(src.size)
+        w, h = max(1, round(src.width * fit)), max(1, round(src.height * fit))
+        src = src.resize((w, h), Image.BILINEAR, reducing_gap=2.0)
+        tile.alpha_composite(src, (int(mid - w / 2), int(mid - h / 2)))
+    else:
+        txt = str(sym["text"])
+        # same size and baseline as draw_card: 16% of the diameter, baseline w / 2.8 below the anchor
+        font = _font(symbol_font(sym, font_fallback), max(1, round(box_px * 0.16 / 0.20)))
+        w = font.getlength(txt)
+        # farthest glyph point from the anchor: a corner of the w x (w / 2.8 + size) box below and beside it
+        side = int(math.ceil(2 * math.hypot(w / 2, w / 2.8 + font.size))) + 2
+        tile = Image.new("RGBA", (side, side), (0, 0, 0, 0))
+        mid = side / 2
+        ImageDraw.Draw(tile).text((mid - w / 2, mid + w / 2.8), txt, font=font, fill=(0, 0, 0, 255), anchor="ls")
+    return tile
+
+
+def render_card(card: List[Dict], positions: List[Tuple[float, float, float, float]], diameter_mm: float,
+                stroke_mm: float, size_px: int, font_fallback: str = "Helvetica-Bold") -> Image.Image:
+    """Rasterize one card as draw_card lays it out: size_px square, transparent outside the disk."""
+    ss = size_px * SUPERSAMPLE
+    px_per_mm = ss / diameter_mm
+    center = ss / 2
+    symbols = Image.new("RGBA", (ss, ss), (0, 0, 0, 0))
+    for sym, (x_mm, y_mm, rot_deg, scale) in zip(card, positions):
+        tile = _symbol_tile(sym, diameter_mm * 0.20 * scale * px_per_mm, font_fallback)
+        # PDF angles and y run counter-clockwise and upwards; PIL rotates counter-clockwise with y down.
+        # Bilinear is enough here: the supersampled card is scaled down afterwards
+        tile = tile.rotate(rot_deg, resample=Image.BILINEAR)
+        x = center + x_mm * px_per_mm - tile.width / 2
+        y = center - y_mm * px_per_mm - tile.height / 2
+        symbols.paste(tile, (round(x), round(y)), tile)
+
+    disk = Image.new("L", (ss, ss), 0)
+    ImageDraw.Draw(disk).ellipse((0, 0, ss - 1, ss - 1), fill=255)
+    out = Image.new("RGBA", (ss, ss), (0, 0, 0, 0))
+    out.paste((255, 255, 255, 255), (0, 0), disk)
+    out.paste(symbols, (0, 0), ImageChops.multiply(symbols.getchannel("A"), disk))  # clip to the card
+    if stroke_mm > 0:
+        width = max(1, round(stroke_mm * px_per_mm))
+        ImageDraw.Draw(out).ellipse((0, 0, ss - 1, ss - 1), outline=(0, 0, 0, 255), width=width)
+    return out.reduce(SUPERSAMPLE)
+
+
+def _prepared(card: List[Dict], card_spec: CardSpec, rconf: RandomSpec, size_px: int) -> List[Dict]:
+    # shrink large images once per preview size (cached like the export's DPI resampling)
+    mul_large = getattr(rconf, "mul_large", (1.15, 1.50))
+    box_mm = card_spec.diameter_mm * 0.20 * float(rconf.scale.max) * float(mul_large[1])
+    dpi = math.ceil(size_px * SUPERSAMPLE / card_spec.diameter_mm * 25.4)
+    return [{**sym, "image": prepare_image(sym["image"], box_mm, dpi)} if sym["type"] == "image" else sym
+            for sym in card]
+
+
+def _thumbnail(index: int, card: List[Dict], card_spec: CardSpec, rconf: RandomSpec, size_px: int) -> Image.Image:
+    positions = card_layout(index, len(card), card_spec.diameter_mm, rconf)
+    return render_card(_prepared(card, card_spec, rconf, size_px), positions,
+                       card_spec.diameter_mm, card_spec.stroke_mm, size_px)
+
+
+def _cache_key(index: int, card: List[Dict], card_spec: CardSpec, rconf: RandomSpec,
+               size_px: int) -> Optional[Hashable]:
+    """Key of one thumbnail, or None without a seed (the layout is random, so nothing to reuse)."""
+    if not rconf.seed:
+        return None
+    # a card's layout depends on its deck index only through the template pool
+    slot = index % rconf.layout_pool if rconf.layout_pool else 0
+    return (tuple(_symbol_key(sym) for sym in card), slot, repr(rconf),
+            card_spec.diameter_mm, card_spec.stroke_mm, size_px)
+
+
+def render_preview(cards: Dict[int, List[Dict]], card_spec: CardSpec, rconf: RandomSpec, size_px: int,
+                   fmt: str = "png") -> Tuple[bytes, int]:
+    """
+    Encode the given cards (deck index -> resolved symbols) as one image: the card
+    itself for a single card, else a contact sheet in index order. Thumbnails are
+    cached per (card content, seed and layout options, size); misses are rasterized
+    on the preview thread pool. Returns the encoded image and the number of cache hits.
+    """
+    thumbs: Dict[int, Image.Image] = {}
+    pending = {}
+    for index, card in cards.items():
+        key = _cache_key(index, card, card_spec, rconf, size_px)
+        cached = preview_cache.get(key) if key is not None else None
+        if cached is not None:
+            thumbs[index] = cached
+        else:
+            pending[index] = (key, _get_pool().submit(_thumbnail, index, card, card_spec, rconf, size_px))
+    for index, (key, fut) in pending.items():
+        thumbs[index] = fut.result() if key is None else preview_cache.put(key, fut.result())
+
+    if len(thumbs) == 1:
+        image = next(iter(thumbs.values()))
+    else:
+        cols = math.ceil(math.sqrt(len(thumbs)))
+        rows = math.ceil(len(thumbs) / cols)
+        step = size_px + SHEET_GAP_PX
+        image = Image.new("RGBA", (cols * step - SHEET_GAP_PX, rows * step - SHEET_GAP_PX), (0, 0, 0, 0))
+        for i, index in enumerate(sorted(thumbs)):
+            image.paste(thumbs[index], ((i % cols) * step, (i // cols) * step))
+
+    buf = io.BytesIO()
+    if fmt == "webp":
+        image.save(buf, "WEBP", quality=WEBP_QUALITY, method=0)
+    else:
+        image.save(buf, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return buf.getvalue(), len(thumbs) - len(pending)
@@ -0,0 +1,89 @@
+# services/result_cache.py
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+from .disk import atomic_write, evict_dir, scan_dir
+
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dobble-exports"))
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ResultCache:
+    """
+    Disk cache of rendered PDFs keyed by request fingerprint. Each entry is
+    <key>.pdf plus a <key>.json sidecar holding the response headers. File mtimes
+    track recency; once the PDFs exceed max_bytes the oldest are removed.
+    """
+
+    def __init__(self, directory: str = EXPORT_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        if not _KEY_RE.match(key):
+            raise ValueError(f"Invalid cache key: {key}")
+        base = os.path.join(self.directory, key)
+        return base + ".pdf", base + ".json"
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """(pdf path, headers) for a cached result, or None."""
+        pdf_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                headers = json.load(f)
+            os.utime(pdf_path)  # mark as recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return pdf_path, headers
+
+    def put(self, key: str, render: Callable[[BinaryIO], None], headers: Dict[str, str]) -> str:
+        """Render straight into the cache and return the PDF path."""
+        pdf_path, meta_path = self._paths(key)
+        with atomic_write(pdf_path) as out:
+            render(out)
+        with atomic_write(meta_path, "w") as f:
+            json.dump(headers, f)
+        self._evict(keep=pdf_path)
+        return pdf_path
+
+    def stats(self) -> Dict[str, int]:
+        entries, total = self._scan()
+        with self._lock:
+            return {
+                "entries": len(entries),
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _scan(self) -> Tuple[list, int]:
+        entries = scan_dir(self.directory, lambda name: name.endswith(".pdf"))
+        return entries, sum(size for _, size, _ in entries)
+
+    def _evict(self, keep: str) -> None:
+        removed = evict_dir(self.directory, self.max_bytes, match=lambda name: name.endswith(".pdf"), keep=keep)
+        for path in removed:
+            try:
+                os.remove(path[:-len(".pdf")] + ".json")
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += len(removed)
+
+
+result_cache = ResultCache()
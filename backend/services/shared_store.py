@@ -0,0 +1,118 @@
+# services/shared_store.py
+import os
+import re
+import tempfile
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no build lock, concurrent builders just write the same file twice
+    fcntl = None
+
+# Arrays shared by every worker process on the host. /dev/shm keeps them in RAM; "" disables the store
+_DEFAULT_DIR = "/dev/shm/dobble-store" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(),
+                                                                                       "dobble-store")
+SHARED_STORE_DIR = os.getenv("SHARED_STORE_DIR", _DEFAULT_DIR)
+
+# Bump when the layout of any stored array changes, so workers never map files from older code
+STORE_VERSION = 1
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9._-]+$")
+
+
+def _map(path: str) -> np.ndarray:
+    # plain ndarray view of the read-only mapping; the mapping lives as long as the view
+    return np.asarray(np.load(path, mmap_mode="r", allow_pickle=False))
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SharedStore:
+    """
+    Write-once .npy files that worker processes map read-only with np.load(mmap_mode="r").
+    The first process to ask for a name builds the array (under a file lock, so it
+    is built once per host) and every process then maps the same page-cache pages:
+    the data is stored once no matter how many workers read it. Nothing is ever
+    evicted, so only data bounded by the server itself belongs here (planes and
+    their index tables), never anything keyed by client input.
+    """
+
+    def __init__(self, directory: Optional[str] = SHARED_STORE_DIR):
+        self.directory = directory or None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _path(self, name: str) -> str:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid shared store name: {name}")
+        return os.path.join(self.directory, f"v{STORE_VERSION}-{name}.npy")
+
+    def array(self, name: str, build: Callable[[], np.ndarray]) -> np.ndarray:
+        """Read-only array for name: mapped from the store, or built, stored and mapped on a miss."""
+        if not self.enabled:
+            return build()
+        path = self._path(name)  # validated before anything is created on disk
+        try:
+            return _map(path)
+        except FileNotFoundError:
+            pass
+        lock_path = path + ".lock"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(lock_path, "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # another worker may have finished it while we waited for the lock
+                    if not os.path.exists(path):
+                        arr = np.ascontiguousarray(build())
+                        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                        try:
+                            with os.fdopen(fd, "wb") as f:
+                                np.save(f, arr, allow_pickle=False)
+                            os.replace(tmp, path)
+                        except BaseException:
+                            _remove(tmp)
+                            raise
+                finally:
+                    # a waiter still holding the unlinked lock finds the array already written
+                    _remove(lock_path)
+            return _map(path)
+        except OSError:
+            # the store is an optimization; fall back to a private copy
+            return build()
+
+    def stats(self) -> Dict[str, object]:
+        entries = total = 0
+        if self.enabled:
+            try:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        if entry.name.endswith(".npy"):
+                            entries += 1
+                            total += entry.stat().st_size
+            except FileNotFoundError:
+                pass
+        return {"enabled": self.enabled, "directory": self.directory, "entries": entries, "bytes": total}
+
+    def clear(self) -> None:
+        if not self.enabled:
+            return
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+shared_store = SharedStore()
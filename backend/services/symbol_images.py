@@ -0,0 +1,177 @@
+# services/symbol_images.py
+import base64
+import hashlib
+import io
+import math
+import os
+import re
+import tempfile
+from typing import Dict, Hashable, Optional, Union
+
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+from .cache import LRUCache
+from .disk import atomic_write, evict_dir
+from .metrics import IMAGE_DECODE_BYTES, IMAGE_DECODES, IMAGE_RESAMPLES
+
+_DATA_URL_RE = re.compile(r"^data:(?P<mime>[^;]+);base64,(?P<b64>.+)$", re.DOTALL)
+
+# What decoding bad input raises: bad base64 (binascii.Error is a ValueError), unreadable or
+# truncated images (UnidentifiedImageError is an OSError), and oversized images
+INVALID_IMAGE_ERRORS = (ValueError, OSError, SyntaxError, Image.DecompressionBombError)
+
+# Budget for decoded symbol pixels kept across exports
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Largest image decoded at all (width x height); a few KB of PNG can declare far more pixels
+SYMBOL_MAX_PIXELS = 4096 * 4096
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def _pixel_bytes(img: ImageReader) -> int:
+    w, h = img.getSize()
+    # decoded PIL pixels plus the RGB copy ReportLab keeps once the image is drawn
+    return w * h * (len(img._image.getbands()) + 3)
+
+
+image_cache: LRUCache[ImageReader] = LRUCache(IMAGE_CACHE_MAX_BYTES, sizeof=_pixel_bytes)
+
+
+def content_key(b64: str) -> str:
+    """Content address of an image: sha256 over its base64 payload."""
+    return hashlib.sha256(b64.strip().encode("ascii")).hexdigest()
+
+
+def image_key(img: ImageReader) -> Hashable:
+    """Content key decode_image tagged the image with (the sha256 of its data URL payload or registry ref)."""
+    key = getattr(img, "_ident", None)
+    if key is None:
+        raise ValueError("Image has no content key; decode it with decode_image")
+    return key
+
+
+def data_url_key(url: str) -> str:
+    """Content key of a data: URL without decoding it (hash of the whole string if malformed)."""
+    match = _DATA_URL_RE.match(url)
+    return content_key(match.group("b64") if match else url)
+
+
+def decode_image(raw: bytes, ident: Optional[Hashable] = None) -> ImageReader:
+    """Decode image bytes once and normalize them to RGB/RGBA pixels; ident tags the content key."""
+    IMAGE_DECODES.inc()
+    IMAGE_DECODE_BYTES.inc(len(raw))
+    img = Image.open(io.BytesIO(raw))
+    # the header is read, the pixels are not: refuse before decoding them
+    w, h = img.size
+    if w * h > SYMBOL_MAX_PIXELS:
+        raise ImageTooLarge(f"Image has {w}x{h} pixels, at most {SYMBOL_MAX_PIXELS} are allowed")
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    img = img.convert("RGBA" if has_alpha else "RGB")
+    img.load()
+    return ImageReader(img, ident=ident)
+
+
+def load_data_url(url: str) -> ImageReader:
+    """
+    Resolve a data: URL to a decoded image, reusing the cached copy when the same
+    content was seen before. Cache hits skip base64 and image decoding entirely.
+    """
+    match = _DATA_URL_RE.match(url)
+    if not match:
+        raise ValueError("Invalid data URL")
+    b64 = match.group("b64")
+    key = content_key(b64)
+    return image_cache.get_or_create(key, lambda: decode_image(base64.b64decode(b64), ident=key))
+
+
+# -- Symbol registry --
+# Uploaded images live on disk under their content ID (sha256 of the raw bytes). Anyone can
+# upload, so the directory is bounded: least recently used images go past the budget
+SYMBOL_REGISTRY_DIR = os.getenv("SYMBOL_REGISTRY_DIR", os.path.join(tempfile.gettempdir(), "dobble-symbols"))
+SYMBOL_REGISTRY_MAX_BYTES = 256 * 1024 * 1024
+SYMBOL_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+_REF_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _registry_path(ref: str) -> str:
+    if not _REF_RE.match(ref):
+        raise ValueError(f"Invalid symbol ref: {ref}")
+    return os.path.join(SYMBOL_REGISTRY_DIR, ref)
+
+
+def register_image(raw: bytes) -> Dict[str, Union[str, int]]:
+    """
+    Validate and store uploaded image bytes; returns the stable content ID (ref).
+    Uploading the same bytes again is a no-op that returns the same ref.
+    """
+    ref = hashlib.sha256(raw).hexdigest()
+    img = decode_image(raw, ident=ref)  # raises for anything PIL cannot read
+    path = _registry_path(ref)
+    try:
+        os.utime(path)  # already stored: mark as recently used
+    except FileNotFoundError:
+        with atomic_write(path) as f:
+            f.write(raw)
+        evict_dir(SYMBOL_REGISTRY_DIR, SYMBOL_REGISTRY_MAX_BYTES, match=_REF_RE.match, keep=path)
+    image_cache.put(("ref", ref), img)
+    w, h = img.getSize()
+    return {"ref": ref, "width": w, "height": h, "bytes": len(raw)}
+
+
+def load_ref(ref: str) -> ImageReader:
+    """Resolve a registry ref to a decoded image; raises KeyError if it was never uploaded or was evicted."""
+    path = _registry_path(ref)
+    try:
+        # checked even when the pixels are cached, so a ref works the same in every worker
+        os.utime(path)  # mark as recently used
+    except FileNotFoundError:
+        raise KeyError(ref)
+
+    def _load() -> ImageReader:
+        try:
+            with open(path, "rb") as f:
+                return decode_image(f.read(), ident=ref)
+        except FileNotFoundError:
+            raise KeyError(ref)
+
+    return image_cache.get_or_create(("ref", ref), _load)
+
+
+# -- Resampling --
+# Quality for opaque symbols re-encoded as JPEG after downscaling
+JPEG_QUALITY = 88
+
+
+def prepare_image(img: ImageReader, box_mm: float, dpi: int) -> ImageReader:
+    """
+    Resample an image so its longest side covers box_mm at the given DPI.
+    Results are cached per (image, target pixels), so each unique symbol is
+    resampled once per card size and DPI.
+    """
+    target_px = max(1, math.ceil(box_mm / 25.4 * dpi))
+    if max(img.getSize()) <= target_px:
+        # already small enough; keep it lossless
+        return img
+    key = getattr(img, "_ident", None)
+    if key is None:
+        return _resample(img, target_px)
+    key = ("dpi", key, target_px)
+    return image_cache.get_or_create(key, lambda: _resample(img, target_px, ident=key))
+
+
+def _resample(img: ImageReader, target_px: int, ident: Optional[Hashable] = None) -> ImageReader:
+    IMAGE_RESAMPLES.inc()
+    small = img._image.copy()
+    small.thumbnail((target_px, target_px), Image.LANCZOS)
+    if small.mode == "RGB":
+        # opaque symbols (typically photos) embed as JPEG and pass through ReportLab as DCT streams
+        buf = io.BytesIO()
+        small.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        buf.seek(0)
+        return ImageReader(buf, ident=ident)
+    return ImageReader(small, ident=ident)
@@ -0,0 +1,82 @@
+import struct
+
+import numpy as np
+import pytest
+
+from backend.services import dobble_logic
+from backend.services.dobble_logic import (VALID_ORDERS, check_deck, generate_projective_plane, pack_deck,
+                                           unpack_deck)
+
+
+@pytest.mark.parametrize("n", VALID_ORDERS)
+def test_plane_is_a_dobble_deck(n):
+    cards = generate_projective_plane(n)
+    assert cards.shape == (n * n + n + 1, n + 1)
+    # n + 1 distinct symbols per card
+    assert all(len(set(row)) == n + 1 for row in cards.tolist())
+    # every pair of cards shares exactly one symbol
+    incidence = np.zeros((len(cards), n * n + n + 1), dtype=np.int64)
+    np.put_along_axis(incidence, cards.astype(np.int64), 1, axis=1)
+    shared = incidence @ incidence.T
+    np.fill_diagonal(shared, 1)
+    assert (shared == 1).all()
+
+
+def _deck(n):
+    return [[f"s{i}" for i in row] for row in generate_projective_plane(n).tolist()]
+
+
+def test_check_deck_reports_offending_pairs():
+    cards = _deck(2)
+    assert check_deck(cards)["valid"]
+    # card 0 loses the symbol it shared with cards 1 and 2
+    cards[0] = ["x" if s == "s0" else s for s in cards[0]]
+    result = check_deck(cards)
+    assert not result["valid"]
+    assert result["bad_pairs"] == 2
+    assert result["pairs"] == [
+        {"card_a": 0, "card_b": 1, "shared": 0, "symbols": []},
+        {"card_a": 0, "card_b": 2, "shared": 0, "symbols": []},
+    ]
+
+
+def test_check_deck_reports_repeated_symbols():
+    cards = _deck(2)
+    cards[3] = [cards[3][0]] * 3
+    assert check_deck(cards)["duplicate_cards"] == [3]
+
+
+@pytest.mark.parametrize("corrupt", [False, True])
+def test_check_deck_spans_several_chunks(monkeypatch, corrupt):
+    monkeypatch.setattr(dobble_logic, "CHECK_DECK_CHUNK_SYMBOLS", 5)
+    cards = _deck(7)  # 57 symbols, 12 chunks
+    if corrupt:
+        # cards 0 and 1 now share s0 and s7
+        cards[1] = cards[1][:-1] + ["s7"]
+    result = check_deck(cards)
+    assert result["num_symbols"] == 57
+    assert result["valid"] is not corrupt
+    if corrupt:
+        assert result["pairs"][0] == {"card_a": 0, "card_b": 1, "shared": 2, "symbols": ["s0", "s7"]}
+
+
+def test_packed_deck_round_trip():
+    cards = generate_projective_plane(7)
+    symbols = [f"sym-{i}" for i in range(57)] + ["é"]
+    packed = pack_deck(cards, symbols)
+    assert packed[:4] == b"DBL1"
+    unpacked, unpacked_symbols = unpack_deck(packed)
+    assert unpacked.dtype == np.dtype("<u2")
+    np.testing.assert_array_equal(unpacked, cards)
+    assert unpacked_symbols == symbols
+
+
+@pytest.mark.parametrize("mangle", [
+    lambda data: b"XXXX" + data[4:],  # wrong magic
+    lambda data: data[:8],  # truncated header
+    lambda data: data[:4] + struct.pack("<HHI", 99, 8, 0) + data[12:],  # more cards than the data holds
+    lambda data: data[:-1],  # truncated symbol list
+])
+def test_unpack_deck_rejects_bad_header(mangle):
+    with pytest.raises(ValueError):
+        unpack_deck(mangle(pack_deck(generate_projective_plane(2), ["a"] * 7)))
@@ -0,0 +1,36 @@
+import pytest
+
+from backend.services import fonts
+from backend.services.fonts import FontRegistry, UnknownFont
+
+
+@pytest.mark.parametrize("name", ["Helvetica", "Times-Roman", "Courier", "Helvetica-Bold"])
+def test_exact_names_ignore_weight(name):
+    registry = FontRegistry()
+    assert registry.resolve(name, 700) == name
+    assert registry.resolve(name, 400) == name
+
+
+@pytest.mark.parametrize("family, weight, expected", [
+    ("helvetica", 700, "Helvetica-Bold"),
+    ("helvetica", 400, "Helvetica"),
+    ("Times", 700, "Times-Bold"),
+    ("times-roman", 700, "Times-Bold"),
+    ("COURIER", None, "Courier"),
+    ("courier", 550, "Courier-Bold"),
+])
+def test_families_pick_closest_weight(family, weight, expected):
+    assert FontRegistry().resolve(family, weight) == expected
+
+
+def test_unknown_family():
+    with pytest.raises(UnknownFont):
+        FontRegistry().resolve("no-such-font", 400)
+
+
+def test_resolution_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(fonts, "RESOLVE_CACHE_MAX_ENTRIES", 8)
+    registry = FontRegistry()
+    for weight in range(100):
+        assert registry.resolve("helvetica", weight) in ("Helvetica", "Helvetica-Bold")
+    assert len(registry._resolved) <= 8